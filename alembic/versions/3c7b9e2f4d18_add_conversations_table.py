@@ -0,0 +1,58 @@
+"""add conversations summary table and group last message
+
+Revision ID: 3c7b9e2f4d18
+Revises: a6e4c0d9f215
+Create Date: 2026-10-17 15:41:12.208734
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3c7b9e2f4d18"
+down_revision: Union[str, Sequence[str], None] = "a6e4c0d9f215"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "conversations",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("peer_id", sa.Integer(), nullable=False),
+        sa.Column("last_message_id", sa.Integer(), nullable=True),
+        sa.Column("last_author_id", sa.Integer(), nullable=True),
+        sa.Column("last_preview", sa.String(length=200), nullable=True),
+        sa.Column("last_image_url", sa.String(), nullable=True),
+        sa.Column("last_message_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("unread_count", sa.Integer(), server_default="0", nullable=False),
+        sa.ForeignKeyConstraint(["last_author_id"], ["users.id"]),
+        sa.ForeignKeyConstraint(["peer_id"], ["users.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("user_id", "peer_id", name="uq_conversations_user_peer"),
+    )
+    op.create_index("ix_conversations_user_recent", "conversations", ["user_id", "last_message_at", "id"], unique=False)
+    op.add_column("groups", sa.Column("last_message_id", sa.Integer(), nullable=True))
+    op.add_column("groups", sa.Column("last_author_id", sa.Integer(), nullable=True))
+    op.add_column("groups", sa.Column("last_preview", sa.String(length=200), nullable=True))
+    op.add_column("groups", sa.Column("last_image_url", sa.String(), nullable=True))
+    op.add_column("groups", sa.Column("last_message_at", sa.DateTime(timezone=True), nullable=True))
+    op.create_foreign_key("groups_last_author_id_fkey", "groups", "users", ["last_author_id"], ["id"])
+    op.create_index("ix_group_members_user_id", "group_members", ["user_id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_group_members_user_id", table_name="group_members")
+    op.drop_constraint("groups_last_author_id_fkey", "groups", type_="foreignkey")
+    for column in ("last_message_at", "last_image_url", "last_preview", "last_author_id", "last_message_id"):
+        op.drop_column("groups", column)
+    op.drop_index("ix_conversations_user_recent", table_name="conversations")
+    op.drop_table("conversations")
@@ -0,0 +1,27 @@
+"""add index for draining pending messages
+
+Revision ID: 5b1e7c3a9d42
+Revises: c9fe8916d7c6
+Create Date: 2026-10-17 10:12:40.118204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5b1e7c3a9d42"
+down_revision: Union[str, Sequence[str], None] = "c9fe8916d7c6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_messages_recipient_status_id", "messages", ["recipient_id", "status", "id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_messages_recipient_status_id", table_name="messages")
@@ -0,0 +1,142 @@
+"""partition messages by month and add archive tables
+
+Revision ID: 7d2e5a1c9b04
+Revises: 3c7b9e2f4d18
+Create Date: 2026-10-17 16:24:38.917205
+
+"""
+
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7d2e5a1c9b04"
+down_revision: Union[str, Sequence[str], None] = "3c7b9e2f4d18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITION_MONTHS_AHEAD = 3
+
+INDEXES = {
+    "messages": [
+        ("ix_messages_id", ["id"]),
+        ("ix_messages_recipient_status_id", ["recipient_id", "status", "id"]),
+        ("ix_messages_author_recipient_id", ["author_id", "recipient_id", "id"]),
+    ],
+    "group_messages": [("ix_group_messages_group_id_id", ["group_id", "id"])],
+}
+FOREIGN_KEYS = {
+    "messages": [("author_id", "users"), ("recipient_id", "users")],
+    "group_messages": [("group_id", "groups"), ("author_id", "users")],
+}
+COLUMNS = {
+    "messages": 'id, author_id, recipient_id, message, "timestamp", status, image_url',
+    "group_messages": 'id, group_id, author_id, message, "timestamp", status, image_url',
+}
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def rebuild(table: str, partitioned: bool) -> None:
+    # Postgres cannot partition a table in place: copy it into a new one and swap.
+    old = f"{table}_old"
+    op.execute(f"ALTER TABLE {table} RENAME TO {old}")
+    op.execute(f"ALTER TABLE {old} RENAME CONSTRAINT {table}_pkey TO {old}_pkey")
+    for name, _ in INDEXES[table]:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    op.execute(f'UPDATE {old} SET "timestamp" = now() WHERE "timestamp" IS NULL')
+
+    if partitioned:
+        op.execute(f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")')
+        # The partition key has to be part of the primary key.
+        op.execute(f'ALTER TABLE {table} ALTER COLUMN "timestamp" SET NOT NULL, ADD PRIMARY KEY (id, "timestamp")')
+        oldest = op.get_bind().execute(sa.text(f'SELECT min("timestamp") FROM {old}')).scalar()
+        now = datetime.now(timezone.utc)
+        month = datetime((oldest or now).year, (oldest or now).month, 1, tzinfo=timezone.utc)
+        last = add_months(datetime(now.year, now.month, 1, tzinfo=timezone.utc), PARTITION_MONTHS_AHEAD)
+        while month <= last:
+            op.execute(
+                f"CREATE TABLE {table}_p{month:%Y_%m} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+            )
+            month = add_months(month, 1)
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+    else:
+        op.execute(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS)")
+        op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id)")
+
+    for column, target in FOREIGN_KEYS[table]:
+        op.create_foreign_key(f"{table}_{column}_fkey", table, target, [column], ["id"])
+    for name, columns in INDEXES[table]:
+        op.create_index(name, table, columns, unique=False)
+    op.execute(f"INSERT INTO {table} ({COLUMNS[table]}) SELECT {COLUMNS[table]} FROM {old}")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    op.execute(f"DROP TABLE {old} CASCADE")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "messages_archive",
+        sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("author_id", sa.Integer(), nullable=False),
+        sa.Column("recipient_id", sa.Integer(), nullable=False),
+        sa.Column("message", sa.Text(), nullable=True),
+        sa.Column("timestamp", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("status", sa.String(), nullable=True),
+        sa.Column("image_url", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(["author_id"], ["users.id"]),
+        sa.ForeignKeyConstraint(["recipient_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_messages_archive_author_recipient_id",
+        "messages_archive",
+        ["author_id", "recipient_id", "id"],
+        unique=False,
+    )
+    op.create_table(
+        "group_messages_archive",
+        sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("group_id", sa.Integer(), nullable=True),
+        sa.Column("author_id", sa.Integer(), nullable=True),
+        sa.Column("message", sa.Text(), nullable=True),
+        sa.Column("timestamp", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=True),
+        sa.Column("image_url", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(["author_id"], ["users.id"]),
+        sa.ForeignKeyConstraint(["group_id"], ["groups.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_group_messages_archive_group_id_id", "group_messages_archive", ["group_id", "id"], unique=False)
+    if op.get_bind().dialect.name == "postgresql":
+        rebuild("messages", partitioned=True)
+        rebuild("group_messages", partitioned=True)
+    else:
+        # The partition rebuild makes group_messages.timestamp NOT NULL; do the same everywhere else.
+        op.execute('UPDATE group_messages SET "timestamp" = CURRENT_TIMESTAMP WHERE "timestamp" IS NULL')
+        with op.batch_alter_table("group_messages") as batch_op:
+            batch_op.alter_column("timestamp", existing_type=sa.DateTime(timezone=True), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        rebuild("messages", partitioned=False)
+        rebuild("group_messages", partitioned=False)
+    with op.batch_alter_table("group_messages") as batch_op:
+        batch_op.alter_column("timestamp", existing_type=sa.DateTime(timezone=True), nullable=True)
+    # Put archived rows back so nothing is lost with the archive tables.
+    for table in ("messages", "group_messages"):
+        op.execute(f"INSERT INTO {table} ({COLUMNS[table]}) SELECT {COLUMNS[table]} FROM {table}_archive")
+    op.drop_index("ix_group_messages_archive_group_id_id", table_name="group_messages_archive")
+    op.drop_table("group_messages_archive")
+    op.drop_index("ix_messages_archive_author_recipient_id", table_name="messages_archive")
+    op.drop_table("messages_archive")
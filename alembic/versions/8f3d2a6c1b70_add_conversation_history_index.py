@@ -0,0 +1,27 @@
+"""add index for paging direct message history
+
+Revision ID: 8f3d2a6c1b70
+Revises: 5b1e7c3a9d42
+Create Date: 2026-10-17 14:31:05.402917
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8f3d2a6c1b70"
+down_revision: Union[str, Sequence[str], None] = "5b1e7c3a9d42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_messages_author_recipient_id", "messages", ["author_id", "recipient_id", "id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_messages_author_recipient_id", table_name="messages")
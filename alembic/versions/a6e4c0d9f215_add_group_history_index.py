@@ -0,0 +1,27 @@
+"""add index for paging group history
+
+Revision ID: a6e4c0d9f215
+Revises: 8f3d2a6c1b70
+Create Date: 2026-10-17 15:02:47.551390
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a6e4c0d9f215"
+down_revision: Union[str, Sequence[str], None] = "8f3d2a6c1b70"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_group_messages_group_id_id", "group_messages", ["group_id", "id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_group_messages_group_id_id", table_name="group_messages")
@@ -0,0 +1,65 @@
+"""add full-text search indexes for messages
+
+Revision ID: e1f4b8a2c630
+Revises: 7d2e5a1c9b04
+Create Date: 2026-10-17 17:05:51.663120
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e1f4b8a2c630"
+down_revision: Union[str, Sequence[str], None] = "7d2e5a1c9b04"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("messages", "messages_archive", "group_messages", "group_messages_archive")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    for table in TABLES:
+        if dialect == "postgresql":
+            # Stored generated column: rewrites the table once, then stays current on every insert.
+            op.execute(
+                f"ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+                f"(to_tsvector('english', coalesce(message, ''))) STORED"
+            )
+            op.execute(f"CREATE INDEX ix_{table}_search ON {table} USING gin (search_vector)")
+        elif dialect == "sqlite":
+            fts = f"{table}_fts"
+            op.execute(
+                f"CREATE VIRTUAL TABLE {fts} USING fts5("
+                f"message, content='{table}', content_rowid='id', tokenize='porter unicode61')"
+            )
+            op.execute(
+                f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {fts}(rowid, message) VALUES (new.id, new.message); END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, message) VALUES ('delete', old.id, old.message); END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {fts}_update AFTER UPDATE OF message ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, message) VALUES ('delete', old.id, old.message); "
+                f"INSERT INTO {fts}(rowid, message) VALUES (new.id, new.message); END"
+            )
+            op.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    for table in TABLES:
+        if dialect == "postgresql":
+            op.execute(f"DROP INDEX IF EXISTS ix_{table}_search")
+            op.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector")
+        elif dialect == "sqlite":
+            for suffix in ("insert", "delete", "update"):
+                op.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{suffix}")
+            op.execute(f"DROP TABLE IF EXISTS {table}_fts")
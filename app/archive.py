@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.models import GroupMessage, GroupMessageArchive, MessageArchive, Messages
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 180))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 1000))
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", 3))
+
+# History endpoints union each live table with its archive, so paging runs from one into the other unnoticed.
+ARCHIVES: dict[Any, Any] = {Messages: MessageArchive, GroupMessage: GroupMessageArchive}
+
+PARTITION_NAME = re.compile(r"_p(\d{4})_(\d{2})$")
+
+
+def horizon(days: int = ARCHIVE_AFTER_DAYS) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(days=days)
+
+
+def month_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+async def archive_batch(db: AsyncSession, model, before: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    live, archive = model.__table__, ARCHIVES[model].__table__
+    conditions = [live.c.timestamp < before]
+    if model is Messages:
+        # Undelivered DMs stay live: the pending catch-up only reads the live table.
+        conditions.append(live.c.status != "pending")
+    result = await db.execute(select(live.c.id).where(*conditions).order_by(live.c.id).limit(batch_size))
+    ids = list(result.scalars().all())
+    if not ids:
+        return 0
+    columns = [column.name for column in live.columns]
+    # The timestamp bound lets Postgres prune to the old partitions for both statements.
+    moving = select(*(live.c[name] for name in columns)).where(live.c.id.in_(ids), live.c.timestamp < before)
+    await db.execute(insert(archive).from_select(columns, moving))
+    await db.execute(delete(live).where(live.c.id.in_(ids), live.c.timestamp < before))
+    await db.commit()
+    return len(ids)
+
+
+async def archive_all(db: AsyncSession, before: datetime | None = None, batch_size: int = ARCHIVE_BATCH_SIZE) -> dict:
+    before = before or horizon()
+    moved = {}
+    for model in ARCHIVES:
+        total = 0
+        while True:
+            count = await archive_batch(db, model, before, batch_size)
+            total += count
+            if count < batch_size:
+                break
+        moved[model.__tablename__] = total
+    logger.info("Messages archived", extra={"before": before.isoformat(), **moved})
+    return moved
+
+
+async def is_partitioned(db: AsyncSession, table: str) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    result = await db.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"), {"table": table}
+    )
+    return result.scalar_one_or_none() is not None
+
+
+async def ensure_partitions(db: AsyncSession, months_ahead: int = PARTITION_MONTHS_AHEAD) -> list[str]:
+    # Created ahead of time so new rows never land in the default partition.
+    created = []
+    current = month_start(datetime.now(timezone.utc))
+    for model in ARCHIVES:
+        table = model.__tablename__
+        if not await is_partitioned(db, table):
+            continue
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            name = partition_name(table, month)
+            await db.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+                )
+            )
+            created.append(name)
+    await db.commit()
+    return created
+
+
+async def drop_empty_partitions(db: AsyncSession, before: datetime | None = None) -> list[str]:
+    cutoff = month_start(before or horizon())
+    dropped = []
+    for model in ARCHIVES:
+        table = model.__tablename__
+        if not await is_partitioned(db, table):
+            continue
+        result = await db.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass(:table)"
+            ),
+            {"table": table},
+        )
+        for name in result.scalars().all():
+            match = PARTITION_NAME.search(name)
+            if not match:
+                continue
+            month = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+            if add_months(month, 1) > cutoff:
+                continue
+            rows = await db.execute(text(f"SELECT 1 FROM {name} LIMIT 1"))
+            if rows.scalar_one_or_none() is None:
+                await db.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+    await db.commit()
+    if dropped:
+        logger.info("Empty partitions dropped", extra={"partitions": dropped})
+    return dropped
+
+
+async def run(db: AsyncSession) -> dict:
+    before = horizon()
+    await ensure_partitions(db)
+    moved = await archive_all(db, before)
+    await drop_empty_partitions(db, before)
+    return moved
+
+
+async def main():
+    async with AsyncSessionLocal() as db:
+        await run(db)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import os
+from typing import Any, Iterable
+
+from sqlalchemy import case, delete, func, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import unread
+from app.database import AsyncSessionLocal
+from app.models import Conversation, Group, GroupMessage, Messages, User
+from app.utils.batching import batches
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_PREVIEW_CHARS = int(os.getenv("CONVERSATION_PREVIEW_CHARS", 100))
+
+LAST_MESSAGE_FIELDS = ("last_message_id", "last_author_id", "last_preview", "last_image_url", "last_message_at")
+KEY_FIELDS = ("user_id", "peer_id")
+
+conversations = Conversation.__table__
+groups = Group.__table__
+
+
+def preview(text: str | None) -> str | None:
+    return text[:CONVERSATION_PREVIEW_CHARS] if text else None
+
+
+def last_message(message: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "last_message_id": message["id"],
+        "last_author_id": message["author_id"],
+        "last_preview": preview(message.get("message")),
+        "last_image_url": message.get("image_url"),
+        "last_message_at": message["timestamp"],
+    }
+
+
+def summary_row(user_id: int, peer_id: int, message: dict[str, Any], unread_count: int) -> dict[str, Any]:
+    return {"user_id": user_id, "peer_id": peer_id, **last_message(message), "unread_count": unread_count}
+
+
+def direct_rows(messages: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+    # One row per side per conversation: a batch may hold several messages for the same pair,
+    # and a single upsert statement must not touch the same row twice.
+    rows: dict[tuple[int, int], dict[str, Any]] = {}
+    for message in sorted(messages, key=lambda m: m["id"]):
+        author_id, recipient_id = message["author_id"], message["recipient_id"]
+        for user_id, peer_id, unread_count in ((author_id, recipient_id, 0), (recipient_id, author_id, 1)):
+            previous = rows.get((user_id, peer_id))
+            if previous:
+                unread_count += previous["unread_count"]
+            rows[(user_id, peer_id)] = summary_row(user_id, peer_id, message, unread_count)
+    return list(rows.values())
+
+
+def _insert(db: AsyncSession):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(conversations)
+    if dialect == "sqlite":
+        return sqlite.insert(conversations)
+    raise NotImplementedError(f"Conversation upserts are not supported on {dialect}")
+
+
+async def upsert(db: AsyncSession, rows: list[dict[str, Any]]):
+    if not rows:
+        return
+    stmt = _insert(db)
+    newer = stmt.excluded.last_message_id > func.coalesce(conversations.c.last_message_id, 0)
+    changes = {
+        field: case((newer, stmt.excluded[field]), else_=conversations.c[field]) for field in LAST_MESSAGE_FIELDS
+    }
+    changes["unread_count"] = conversations.c.unread_count + stmt.excluded.unread_count
+    await db.execute(stmt.on_conflict_do_update(index_elements=list(KEY_FIELDS), set_=changes), rows)
+
+
+async def record_direct(db: AsyncSession, messages: Iterable[dict[str, Any]]):
+    await upsert(db, direct_rows(messages))
+
+
+async def record_group(db: AsyncSession, group_id: int, message: dict[str, Any]):
+    # One row per group, not per member: members' unread counts come from their read markers.
+    await db.execute(
+        update(groups)
+        .where(groups.c.id == group_id, func.coalesce(groups.c.last_message_id, 0) < message["id"])
+        .values(**last_message(message))
+    )
+
+
+def _where(user_id: int, peer_id: int):
+    return (conversations.c.user_id == user_id) & (conversations.c.peer_id == peer_id)
+
+
+async def mark_read(db: AsyncSession, user_id: int, peer_id: int, amount: int):
+    left = conversations.c.unread_count - amount
+    await db.execute(
+        update(conversations).where(_where(user_id, peer_id)).values(unread_count=case((left > 0, left), else_=0))
+    )
+
+
+async def _messages_by_id(db: AsyncSession, ids: set[int]) -> dict[int, dict[str, Any]]:
+    if not ids:
+        return {}
+    result = await db.execute(
+        select(Messages.id, Messages.author_id, Messages.message, Messages.image_url, Messages.timestamp).where(
+            Messages.id.in_(ids)
+        )
+    )
+    return {row.id: dict(row._mapping) for row in result.all()}
+
+
+async def rows_from_db(db: AsyncSession, user_ids: list[int]) -> list[dict[str, Any]]:
+    counts = await unread.counts_from_db(db, user_ids)
+    batch = set(user_ids)
+
+    result = await db.execute(
+        select(Messages.author_id, Messages.recipient_id, func.max(Messages.id))
+        .where(or_(Messages.author_id.in_(user_ids), Messages.recipient_id.in_(user_ids)))
+        .group_by(Messages.author_id, Messages.recipient_id)
+    )
+    latest: dict[tuple[int, int], int] = {}
+    for author_id, recipient_id, message_id in result.all():
+        for user_id, peer_id in ((author_id, recipient_id), (recipient_id, author_id)):
+            if user_id in batch:
+                latest[(user_id, peer_id)] = max(latest.get((user_id, peer_id), 0), message_id)
+    direct = await _messages_by_id(db, set(latest.values()))
+    return [
+        summary_row(uid, peer_id, direct[mid], counts[uid]["direct"].get(peer_id, 0))
+        for (uid, peer_id), mid in latest.items()
+    ]
+
+
+async def rebuild_groups(db: AsyncSession):
+    latest = select(func.max(GroupMessage.id)).where(GroupMessage.group_id == groups.c.id).scalar_subquery()
+    await db.execute(update(groups).values(last_message_id=latest))
+
+    def field(column):
+        return select(column).where(GroupMessage.id == groups.c.last_message_id).scalar_subquery()
+
+    await db.execute(
+        update(groups).values(
+            last_author_id=field(GroupMessage.author_id),
+            last_preview=field(func.substr(GroupMessage.message, 1, CONVERSATION_PREVIEW_CHARS)),
+            last_image_url=field(GroupMessage.image_url),
+            last_message_at=field(GroupMessage.timestamp),
+        )
+    )
+    await db.commit()
+
+
+async def rebuild(db: AsyncSession, user_ids: list[int] | None = None) -> int:
+    if user_ids is None:
+        result = await db.execute(select(User.id).order_by(User.id))
+        user_ids = list(result.scalars().all())
+    for batch in batches(user_ids):
+        rows = await rows_from_db(db, batch)
+        await db.execute(delete(conversations).where(conversations.c.user_id.in_(batch)))
+        if rows:
+            await db.execute(insert(conversations), rows)
+        await db.commit()
+    await rebuild_groups(db)
+    logger.info("Conversation list rebuilt", extra={"users": len(user_ids)})
+    return len(user_ids)
+
+
+async def main():
+    async with AsyncSessionLocal() as db:
+        await rebuild(db)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,10 +1,16 @@
 import logging
 import os
-from typing import AsyncIterator
+import time
+from typing import Any, AsyncIterator
 
 from dotenv import load_dotenv
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from fastapi import Request
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.utils.cache import TTLCache
 
 load_dotenv()
 
@@ -14,20 +20,147 @@ logger = logging.getLogger(__name__)
 
 if TESTING:
     DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+    DATABASE_REPLICA_URL = DATABASE_URL
 else:
     DATABASE_URL = os.getenv("DATABASE_URL", "")
+    DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL", "")
 
 if not DATABASE_URL:
     logger.error("DATABASE_URL not found", exc_info=True)
     raise ValueError("DATABASE_URL is missing in .env")
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+DB_PROFILES = {
+    "dev": {"pool_size": 5, "max_overflow": 5, "pool_timeout": 30, "pool_recycle": -1, "pool_pre_ping": False},
+    "prod": {"pool_size": 20, "max_overflow": 10, "pool_timeout": 10, "pool_recycle": 1800, "pool_pre_ping": True},
+}
+DB_PROFILE = os.getenv("DB_PROFILE", "prod")
+if DB_PROFILE not in DB_PROFILES:
+    raise ValueError(f"Unknown DB_PROFILE: {DB_PROFILE}")
+DB_ECHO = DB_PROFILE == "dev" and os.getenv("DB_ECHO", "1") == "1"
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 500))
+READ_STICKY_SECONDS = float(os.getenv("READ_STICKY_SECONDS", 5))
+
+
+def engine_options(url: str, profile: str = DB_PROFILE) -> dict:
+    options: dict[str, Any] = dict(DB_PROFILES[profile])
+    for key, env, cast in (
+        ("pool_size", "DB_POOL_SIZE", int),
+        ("max_overflow", "DB_MAX_OVERFLOW", int),
+        ("pool_timeout", "DB_POOL_TIMEOUT", float),
+        ("pool_recycle", "DB_POOL_RECYCLE", int),
+    ):
+        value = os.getenv(env)
+        if value is not None:
+            options[key] = cast(value)
+    if os.getenv("DB_PRE_PING") is not None:
+        options["pool_pre_ping"] = os.getenv("DB_PRE_PING") == "1"
+    if url.startswith("postgresql+asyncpg"):
+        options["connect_args"] = {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    return options
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    # Times every checkout so pool exhaustion shows up as wait time in /metrics.
+    acquired = 0
+    timeouts = 0
+    wait_total = 0.0
+    wait_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            self.acquired += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+
+def make_engine(url: str, profile: str = DB_PROFILE) -> AsyncEngine:
+    return create_async_engine(url, echo=DB_ECHO, poolclass=TimedQueuePool, **engine_options(url, profile))
+
+
+engine = make_engine(DATABASE_URL)
 
 AsyncSessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 
+read_engine = make_engine(DATABASE_REPLICA_URL) if DATABASE_REPLICA_URL else engine
+ReadSessionLocal = async_sessionmaker(bind=read_engine, class_=AsyncSession, expire_on_commit=False)
+
+# Users who wrote recently read from the primary so they see their own writes despite replica lag.
+recent_writers = TTLCache[int, bool](maxsize=100_000, ttl=READ_STICKY_SECONDS)
+
 Base = declarative_base()
 
 
 async def get_db() -> AsyncIterator[AsyncSession]:
     async with AsyncSessionLocal() as session:
         yield session
+
+
+def primary_key(user_id: int) -> str:
+    return f"db:primary:{user_id}"
+
+
+def queue_mark_write(pipe, user_id: int):
+    recent_writers.set(user_id, True)
+    if pipe is not None:
+        pipe.set(primary_key(user_id), 1, px=int(READ_STICKY_SECONDS * 1000))
+
+
+async def reads_from_primary(redis, user_id: int) -> bool:
+    if read_engine is engine or recent_writers.get(user_id):
+        return True
+    return bool(redis and await redis.exists(primary_key(user_id)))
+
+
+async def read_session(redis, user_id: int | None) -> AsyncSession:
+    if user_id is not None and await reads_from_primary(redis, user_id):
+        return AsyncSessionLocal()
+    return ReadSessionLocal()
+
+
+async def get_read_db(request: Request) -> AsyncIterator[AsyncSession]:
+    # user_id is set by the write-tracking middleware in app.main.
+    user_id = getattr(request.state, "user_id", None)
+    redis = getattr(request.app.state, "redis", None)
+    async with await read_session(redis, user_id) as session:
+        yield session
+
+
+def pool_stats(db_engine: AsyncEngine = engine) -> dict:
+    pool = db_engine.sync_engine.pool
+    stats: dict = {"profile": DB_PROFILE}
+    if isinstance(pool, TimedQueuePool):
+        stats.update(
+            {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+                "acquired": pool.acquired,
+                "timeouts": pool.timeouts,
+                "avg_wait_ms": round(pool.wait_total / pool.acquired * 1000, 3) if pool.acquired else 0.0,
+                "max_wait_ms": round(pool.wait_max * 1000, 3),
+            }
+        )
+    return stats
+
+
+async def health(db_engine: AsyncEngine = engine) -> dict:
+    start = time.perf_counter()
+    try:
+        async with db_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except Exception as e:
+        return {"status": "down", "error": str(e), "pool": pool_stats(db_engine)}
+    return {
+        "status": "ok",
+        "latency_ms": round((time.perf_counter() - start) * 1000, 3),
+        "pool": pool_stats(db_engine),
+    }
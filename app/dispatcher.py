@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_WORKERS = int(os.getenv("SUBSCRIBER_WORKERS", 4))
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("SUBSCRIBER_QUEUE_SIZE", 1000))
+
+
+class Dispatcher:
+    def __init__(
+        self,
+        handler: Callable[..., Awaitable[Any]],
+        workers: int = SUBSCRIBER_WORKERS,
+        queue_size: int = SUBSCRIBER_QUEUE_SIZE,
+    ):
+        self.handler = handler
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queues: list[asyncio.Queue] = []
+        self.tasks: list[asyncio.Task] = []
+        self.dispatched = 0
+        self.failed = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self.tasks)
+
+    def start(self):
+        if self.running:
+            return
+        loop = asyncio.get_running_loop()
+        self.queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(self.workers)]
+        self.tasks = [loop.create_task(self._work(queue)) for queue in self.queues]
+
+    async def stop(self):
+        tasks, self.tasks = self.tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def submit(self, key: Hashable, *args: Any):
+        # Everything with the same key goes to the same worker, so it is handled in order.
+        queue = self.queues[hash(key) % len(self.queues)]
+        await queue.put((asyncio.get_running_loop().time(), args))
+
+    async def join(self):
+        for queue in self.queues:
+            await queue.join()
+
+    async def _work(self, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            enqueued_at, args = await queue.get()
+            lag = loop.time() - enqueued_at
+            self.lag_total += lag
+            self.lag_max = max(self.lag_max, lag)
+            try:
+                await self.handler(*args)
+            except Exception:
+                self.failed += 1
+                logger.error("Subscriber handler failed", exc_info=True)
+            finally:
+                self.dispatched += 1
+                queue.task_done()
+
+    def stats(self) -> dict:
+        depths = [queue.qsize() for queue in self.queues]
+        return {
+            "workers": self.workers,
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "dispatched": self.dispatched,
+            "failed": self.failed,
+            "avg_lag_ms": round(self.lag_total / self.dispatched * 1000, 3) if self.dispatched else 0.0,
+            "max_lag_ms": round(self.lag_max * 1000, 3),
+        }
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from redis.exceptions import ResponseError
+
+logger = logging.getLogger(__name__)
+
+EVENT_BUS = os.getenv("EVENT_BUS", "pubsub")
+EVENT_STREAM_MAXLEN = int(os.getenv("EVENT_STREAM_MAXLEN", 10000))
+EVENT_STREAM_BATCH = int(os.getenv("EVENT_STREAM_BATCH", 100))
+EVENT_STREAM_BLOCK_MS = int(os.getenv("EVENT_STREAM_BLOCK_MS", 200))
+EVENT_STREAM_TTL = int(os.getenv("EVENT_STREAM_TTL", 86400))
+# Must survive restarts: a new name per boot would skip replay and leave the old group behind.
+EVENT_STREAM_GROUP = os.getenv("EVENT_STREAM_GROUP") or os.getenv("NODE_ID")
+
+
+def stream_key(channel: str) -> str:
+    return f"stream:{channel}"
+
+
+def _text(value: bytes | str) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+async def publish(redis, channel: str, frame: str):
+    if EVENT_BUS == "streams":
+        pipe = redis.pipeline(transaction=False)
+        queue_publish(pipe, channel, frame)
+        await pipe.execute()
+    else:
+        await redis.publish(channel, frame)
+
+
+def queue_publish(pipe, channel: str, frame: str):
+    if EVENT_BUS == "streams":
+        pipe.xadd(stream_key(channel), {"data": frame}, maxlen=EVENT_STREAM_MAXLEN, approximate=True)
+        # Idle streams (users who went away) expire instead of piling up.
+        pipe.expire(stream_key(channel), EVENT_STREAM_TTL)
+    else:
+        pipe.publish(channel, frame)
+
+
+# Reads through a consumer group named by EVENT_STREAM_GROUP and exposes the part of PubSub the
+# subscriber uses. A batch is acknowledged when the consumer asks for the next one.
+class StreamSubscription:
+    def __init__(
+        self,
+        redis,
+        group: str | None = None,
+        batch: int = EVENT_STREAM_BATCH,
+        block_ms: int = EVENT_STREAM_BLOCK_MS,
+    ):
+        group = group or EVENT_STREAM_GROUP
+        if not group:
+            raise ValueError("EVENT_BUS=streams requires EVENT_STREAM_GROUP (or NODE_ID) to be set")
+        self.redis = redis
+        self.group = group
+        self.batch = batch
+        self.block_ms = block_ms
+        # awaited before a batch is acked, so entries handed to workers are delivered first
+        self.drain: Callable[[], Awaitable[Any]] | None = None
+        # stream key -> next id to read: "0" replays our pending entries, ">" reads new ones
+        self.streams: dict[str, str] = {}
+
+    async def create_group(self, key: str, start: str = "$"):
+        try:
+            await self.redis.xgroup_create(key, self.group, id=start, mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        await self.redis.expire(key, EVENT_STREAM_TTL)
+
+    async def subscribe(self, *channels: str):
+        for channel in channels:
+            key = stream_key(channel)
+            await self.create_group(key)
+            self.streams[key] = "0"
+
+    async def unsubscribe(self, *channels: str):
+        if not channels:
+            self.streams.clear()
+            return
+        for channel in channels:
+            key = stream_key(channel)
+            self.streams.pop(key, None)
+            # A clean leave drops the group; a crash keeps it so a restart can replay.
+            await self.redis.xgroup_destroy(key, self.group)
+
+    async def close(self):
+        self.streams.clear()
+
+    async def read(self) -> list[tuple[str, list[tuple[bytes, dict]]]]:
+        if not self.streams:
+            await asyncio.sleep(self.block_ms / 1000)
+            return []
+        replaying = "0" in self.streams.values()
+        streams = dict(self.streams)
+        try:
+            response = await self.redis.xreadgroup(
+                self.group,
+                self.group,
+                streams=streams,
+                count=self.batch,
+                block=None if replaying else self.block_ms,
+            )
+        except ResponseError as e:
+            # Our group went away under the read: unsubscribed meanwhile, or the stream expired.
+            if "NOGROUP" not in str(e) and "UNBLOCKED" not in str(e):
+                raise
+            for key in streams:
+                if key in self.streams:
+                    # Anything in a recreated stream is newer than what we last read.
+                    await self.create_group(key, start="0")
+            return []
+        batches = [(_text(key), entries) for key, entries in response or []]
+        if replaying:
+            returned = {key for key, entries in batches if entries}
+            for key, cursor in self.streams.items():
+                if cursor == "0" and key not in returned:
+                    self.streams[key] = ">"
+        return batches
+
+    async def listen(self) -> AsyncIterator[dict[str, Any]]:
+        prefix = len(stream_key(""))
+        while True:
+            batches = await self.read()
+            for key, entries in batches:
+                for _, fields in entries:
+                    if fields is None:
+                        continue
+                    data = fields.get(b"data", fields.get("data"))
+                    yield {"type": "message", "channel": key[prefix:], "data": data}
+            if batches and self.drain:
+                await self.drain()
+            if batches:
+                pipe = self.redis.pipeline(transaction=False)
+                for key, entries in batches:
+                    if entries:
+                        pipe.xack(key, self.group, *[entry_id for entry_id, _ in entries])
+                await pipe.execute()
+
+
+def subscription(redis):
+    return StreamSubscription(redis) if EVENT_BUS == "streams" else redis.pubsub()
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import os
+from typing import Any
+
+import redis.asyncio as aioredis
+from sqlalchemy import literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.models import Conversation, Group
+from app.redis_client import db as redis_db
+from app.redis_client import host, port
+from app.utils.serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", 50))
+HISTORY_CACHE_TTL = int(os.getenv("HISTORY_CACHE_TTL", 3600))
+HISTORY_WARM_CONVERSATIONS = int(os.getenv("HISTORY_WARM_CONVERSATIONS", 1000))
+
+DIRECT_FIELDS = (
+    "message_id",
+    "author_id",
+    "recipient_id",
+    "author_name",
+    "recipient_name",
+    "message",
+    "image_url",
+    "timestamp",
+    "status",
+)
+GROUP_FIELDS = ("message_id", "author_id", "author_name", "message", "image_url", "timestamp")
+
+# KEYS: list, generation, status hash  ARGV: entry, size, ttl ms
+# Only extends lists that already hold the newest messages; a missing list is left for warm() to fill.
+APPEND_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('PEXPIRE', KEYS[2], ARGV[3])
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('RPUSH', KEYS[1], ARGV[1])
+    redis.call('LTRIM', KEYS[1], -tonumber(ARGV[2]), -1)
+    redis.call('PEXPIRE', KEYS[1], ARGV[3])
+    redis.call('PEXPIRE', KEYS[3], ARGV[3])
+end
+return 1
+"""
+
+# KEYS: list, generation, status hash  ARGV: generation seen before the DB read, ttl ms, entries...
+# Skipped if anything was appended meanwhile, since the DB snapshot may predate it.
+WARM_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[2]) or '0') ~= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('RPUSH', KEYS[1], unpack(ARGV, 3))
+redis.call('PEXPIRE', KEYS[1], ARGV[2])
+redis.call('PEXPIRE', KEYS[3], ARGV[2])
+return 1
+"""
+
+# KEYS: status hash  ARGV: field, message id, ttl ms
+WATERMARK_SCRIPT = """
+local current = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+if tonumber(ARGV[2]) > current then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+end
+redis.call('PEXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+counters = {"hits": 0, "misses": 0, "warms": 0, "skipped_warms": 0}
+
+
+def direct_key(user_id: int, peer_id: int) -> str:
+    low, high = sorted((user_id, peer_id))
+    return f"history:dm:{low}:{high}"
+
+
+def group_key(group_id: int) -> str:
+    return f"history:group:{group_id}"
+
+
+def _keys(key: str) -> tuple[str, str, str]:
+    return key, f"{key}:gen", f"{key}:status"
+
+
+def entry(payload: dict[str, Any], fields: tuple[str, ...]) -> str:
+    return dumps({field: payload.get(field) for field in fields})
+
+
+def queue_append(pipe, key: str, frame: str):
+    if pipe is not None:
+        pipe.eval(APPEND_SCRIPT, 3, *_keys(key), frame, HISTORY_CACHE_SIZE, HISTORY_CACHE_TTL * 1000)
+
+
+def queue_mark_status(pipe, author_id: int, recipient_id: int, status: str, up_to: int):
+    # DM statuses only move forward and always for everything up to an id, so one watermark per reader is enough.
+    if pipe is not None:
+        key = _keys(direct_key(author_id, recipient_id))[2]
+        pipe.eval(WATERMARK_SCRIPT, 1, key, f"{status}:{recipient_id}", up_to, HISTORY_CACHE_TTL * 1000)
+
+
+async def mark_delivered(redis, recipient_id: int, latest_by_author: dict[int, int]):
+    if not redis or not latest_by_author:
+        return
+    pipe = redis.pipeline(transaction=False)
+    for author_id, message_id in latest_by_author.items():
+        queue_mark_status(pipe, author_id, recipient_id, "delivered", message_id)
+    await pipe.execute()
+
+
+def apply_status(entries: list[dict[str, Any]], watermarks: dict) -> None:
+    for item in entries:
+        if "status" not in item:
+            continue
+        recipient = item.get("recipient_id")
+        if item["message_id"] <= int(watermarks.get(f"read:{recipient}", 0)):
+            item["status"] = "read"
+        elif item["status"] == "pending" and item["message_id"] <= int(watermarks.get(f"delivered:{recipient}", 0)):
+            item["status"] = "delivered"
+
+
+def cacheable(redis, limit: int, *page_args) -> bool:
+    return bool(redis) and limit <= HISTORY_CACHE_SIZE and all(arg is None for arg in page_args)
+
+
+async def first_page(redis, key: str, limit: int) -> tuple[list[dict[str, Any]], bool] | None:
+    list_key, _, status_key = _keys(key)
+    pipe = redis.pipeline(transaction=False)
+    pipe.lrange(list_key, -limit, -1)
+    pipe.llen(list_key)
+    pipe.hgetall(status_key)
+    raw, length, watermarks = await pipe.execute()
+    if not length:
+        counters["misses"] += 1
+        return None
+    counters["hits"] += 1
+    entries = [loads(item) for item in raw]
+    apply_status(entries, {_text(k): v for k, v in watermarks.items()})
+    # A full list may have had older messages trimmed off; a short one is the whole conversation.
+    return entries, length > limit or length >= HISTORY_CACHE_SIZE
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, (bytes, bytearray)) else value
+
+
+async def generation(redis, key: str) -> int:
+    return int(await redis.get(_keys(key)[1]) or 0)
+
+
+async def warm(redis, key: str, seen: int, entries: list[dict[str, Any]], fields: tuple[str, ...]) -> bool:
+    if not entries:
+        return False
+    frames = [entry(item, fields) for item in entries[-HISTORY_CACHE_SIZE:]]
+    stored = await redis.eval(WARM_SCRIPT, 3, *_keys(key), seen, HISTORY_CACHE_TTL * 1000, *frames)
+    counters["warms" if stored else "skipped_warms"] += 1
+    return bool(stored)
+
+
+def stats() -> dict:
+    lookups = counters["hits"] + counters["misses"]
+    return {**counters, "hit_rate": round(counters["hits"] / lookups, 3) if lookups else 0.0}
+
+
+async def warm_recent(redis, db: AsyncSession, conversations: int = HISTORY_WARM_CONVERSATIONS) -> int:
+    # Imported here: the routers import this module to serve and append.
+    from app.routers.groups import group_history
+    from app.routers.messages import direct_history
+
+    # Each DM has a row per side, so twice as many are read to cover the same number of chats.
+    result = await db.execute(
+        select(literal("direct"), Conversation.user_id, Conversation.peer_id, Conversation.last_message_at)
+        .order_by(Conversation.last_message_at.desc())
+        .limit(conversations * 2)
+    )
+    recent = list(result.all())
+    result = await db.execute(
+        select(literal("group"), literal(0), Group.id, Group.last_message_at)
+        .where(Group.last_message_at.is_not(None))
+        .order_by(Group.last_message_at.desc())
+        .limit(conversations)
+    )
+    recent += result.all()
+    recent.sort(key=lambda row: row[3], reverse=True)
+    warmed: set[str] = set()
+    for kind, user_id, peer_id, _ in recent:
+        key = direct_key(user_id, peer_id) if kind == "direct" else group_key(peer_id)
+        if key in warmed:
+            continue
+        warmed.add(key)
+        seen = await generation(redis, key)
+        if kind == "direct":
+            entries, _ = await direct_history(db, user_id, peer_id, None, None, HISTORY_CACHE_SIZE)
+            await warm(redis, key, seen, entries, DIRECT_FIELDS)
+        else:
+            entries, _ = await group_history(db, peer_id, None, None, HISTORY_CACHE_SIZE)
+            await warm(redis, key, seen, entries, GROUP_FIELDS)
+        if len(warmed) >= conversations:
+            break
+    logger.info("History cache warmed", extra={"conversations": len(warmed)})
+    return len(warmed)
+
+
+async def main():
+    redis = aioredis.Redis(host=host, port=port, db=redis_db)
+    try:
+        async with AsyncSessionLocal() as db:
+            await warm_recent(redis, db)
+    finally:
+        await redis.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,15 +2,20 @@ import asyncio
 import logging
 from contextlib import asynccontextmanager
 
-from fastapi import Depends, FastAPI
+from fastapi import Depends, FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
+from app import database, history_cache, redis_client
+from app.auth_service import token_user_id
 from app.logging_config import setup_logging
-from app.redis_client import close_redis, get_redis, init_redis
-from app.redis_subscriber import start_redis_listener
-from app.routers import auth, groups, messages, uploads, users, ws
-from app.routers.ws import CHAT_CHANNEL, PRESENCE_CHANNEL, READ_CHANNEL
+from app.message_batcher import MESSAGE_BATCHING, message_batcher
+from app.presence import start_presence_tasks
+from app.redis_client import close_redis, get_redis, init_redis, pipelined
+from app.redis_subscriber import dispatcher, start_redis_listener
+from app.routers import auth, conversations, groups, messages, search, uploads, users, ws
+from app.routers.ws import PRESENCE_CHANNEL, manager
+from app.utils.user import USER_CHANNEL
 
 
 @asynccontextmanager
@@ -18,19 +23,25 @@ async def lifespan(app: FastAPI):
     await init_redis(app)  # type: ignore
     logger.info("Redis initialized")
     redis = app.state.redis
-    app.state.redis_task = await start_redis_listener(redis, channels=(CHAT_CHANNEL, PRESENCE_CHANNEL, READ_CHANNEL))
+    app.state.redis_task = await start_redis_listener(app.state.redis_pubsub, channels=(PRESENCE_CHANNEL, USER_CHANNEL))
+    app.state.presence_tasks = start_presence_tasks(redis, manager.active.keys)
+    if MESSAGE_BATCHING:
+        message_batcher.start()
+        logger.info("Message batcher started")
     logger.info("Fastapi lifespan startup complete")
     try:
         yield
     finally:
         logger.info("Fastapi shutting down")
-        task = getattr(app.state, "redis_task", None)
-        if task:
-            task.cancel()
-            try:
-                await task
-            except asyncio.CancelledError:
-                pass
+        tasks = [getattr(app.state, "redis_task", None), *getattr(app.state, "presence_tasks", [])]
+        for task in tasks:
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        await message_batcher.stop()
         await close_redis(app)  # type: ignore
 
 
@@ -56,6 +67,24 @@ app.include_router(messages.router)
 app.include_router(ws.router)
 app.include_router(uploads.router)
 app.include_router(groups.router)
+app.include_router(conversations.router)
+app.include_router(search.router)
+
+
+@app.middleware("http")
+async def stick_writers_to_primary(request: Request, call_next):
+    # Resolved once here and reused by get_read_db to pick primary or replica.
+    user_id = request.state.user_id = token_user_id(request.headers.get("authorization"))
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        if user_id is not None:
+            redis = getattr(request.app.state, "redis", None)
+            if redis:
+                async with pipelined(redis) as pipe:
+                    database.queue_mark_write(pipe, user_id)
+            else:
+                database.queue_mark_write(None, user_id)
+    return response
 
 
 @app.get("/redis-test")
@@ -65,6 +94,28 @@ async def redis_test(redis=Depends(get_redis)):
     return {"stored_value": value.decode()}
 
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "websocket": manager.stats(),
+        "subscriber": dispatcher.stats(),
+        "database": database.pool_stats(),
+        "history_cache": history_cache.stats(),
+        "redis": {
+            "commands": redis_client.pool_stats(redis_client.redis_client),
+            "pubsub": redis_client.pool_stats(redis_client.pubsub_client),
+        },
+    }
+
+
+@app.get("/health")
+async def health(response: Response, redis=Depends(get_redis)):
+    checks = {"database": await database.health(), "redis": await redis_client.health(redis)}
+    if any(check["status"] == "down" for check in checks.values()):
+        response.status_code = 503
+    return checks
+
+
 @app.get("/")
 def root():
     return {"message": "Chat app backend is running"}
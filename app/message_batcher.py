@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app import conversations
+from app.database import AsyncSessionLocal
+from app.models import Messages
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_BATCHING = os.getenv("MESSAGE_BATCHING") == "1"
+MESSAGE_BATCH_SIZE = int(os.getenv("MESSAGE_BATCH_SIZE", 100))
+MESSAGE_BATCH_INTERVAL_MS = float(os.getenv("MESSAGE_BATCH_INTERVAL_MS", 5))
+
+
+class MessageBatcher:
+    def __init__(
+        self,
+        max_batch: int = MESSAGE_BATCH_SIZE,
+        interval_ms: float = MESSAGE_BATCH_INTERVAL_MS,
+        session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+    ):
+        self.max_batch = max_batch
+        self.interval = interval_ms / 1000
+        self.session_factory = session_factory
+        # None is the stop marker: the loop flushes what it holds and exits instead of being cancelled.
+        self.queue: asyncio.Queue[tuple[dict[str, Any], asyncio.Future] | None] = asyncio.Queue()
+        self.task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self):
+        if not self.running:
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        # Cleared first so new sends take the direct insert path while the loop drains.
+        task, self.task = self.task, None
+        if task and not task.done():
+            await self.queue.put(None)
+            await task
+        batch = []
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is not None:
+                batch.append(item)
+        if batch:
+            await self._flush(batch)
+
+    async def submit(self, **values: Any) -> tuple[int, datetime]:
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        await self.queue.put((values, future))
+        return await future
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = asyncio.get_running_loop().time() + self.interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[tuple[dict[str, Any], asyncio.Future]]):
+        try:
+            await self._insert(batch)
+        except Exception as e:
+            if len(batch) > 1:
+                # One bad row must not fail everyone else's send: retry row by row.
+                logger.warning("Message batch insert failed, retrying rows singly", extra={"batch_size": len(batch)})
+                for item in batch:
+                    await self._flush([item])
+                return
+            logger.error("Message insert failed", exc_info=True)
+            _, future = batch[0]
+            if not future.done():
+                future.set_exception(e)
+
+    async def _insert(self, batch: list[tuple[dict[str, Any], asyncio.Future]]):
+        rows = [values for values, _ in batch]
+        stmt = insert(Messages).returning(Messages.id, Messages.timestamp, sort_by_parameter_order=True)
+        async with self.session_factory() as db:
+            result = await db.execute(stmt, rows)
+            inserted = result.all()
+            await conversations.record_direct(
+                db, ({**values, "id": mid, "timestamp": ts} for values, (mid, ts) in zip(rows, inserted))
+            )
+            await db.commit()
+        for (_, future), (message_id, timestamp) in zip(batch, inserted):
+            if not future.done():
+                future.set_result((message_id, timestamp))
+
+
+message_batcher = MessageBatcher()
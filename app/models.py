@@ -1,4 +1,4 @@
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text, func
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint, func
 from sqlalchemy.orm import relationship
 
 from app.database import Base
@@ -29,6 +29,11 @@ class Messages(Base):
     author = relationship("User", foreign_keys=[author_id])
     recipient = relationship("User", foreign_keys=[recipient_id])
 
+    __table_args__ = (
+        Index("ix_messages_recipient_status_id", "recipient_id", "status", "id"),
+        Index("ix_messages_author_recipient_id", "author_id", "recipient_id", "id"),
+    )
+
 
 class Group(Base):
     __tablename__ = "groups"
@@ -37,6 +42,11 @@ class Group(Base):
     name = Column(String(225))
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_message_id = Column(Integer, nullable=True)
+    last_author_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    last_preview = Column(String(200), nullable=True)
+    last_image_url = Column(String, nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
 
 
 class GroupMember(Base):
@@ -48,6 +58,8 @@ class GroupMember(Base):
     joined_at = Column(DateTime(timezone=True), server_default=func.now())
     last_read_message_id = Column(Integer, default=0)
 
+    __table_args__ = (Index("ix_group_members_user_id", "user_id"),)
+
 
 class GroupMessage(Base):
     __tablename__ = "group_messages"
@@ -56,9 +68,58 @@ class GroupMessage(Base):
     group_id = Column(Integer, ForeignKey("groups.id"))
     author_id = Column(Integer, ForeignKey("users.id"))
     message = Column(Text, nullable=True)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     status = Column(String(20), default="pending")
     image_url = Column(String, nullable=True)
 
     author = relationship("User", foreign_keys=[author_id])
     group = relationship("Group", foreign_keys=[group_id])
+
+    __table_args__ = (Index("ix_group_messages_group_id_id", "group_id", "id"),)
+
+
+class MessageArchive(Base):
+    __tablename__ = "messages_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    recipient_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    message = Column(Text, nullable=True)
+    timestamp = Column(DateTime(timezone=True), nullable=False)
+    status = Column(String)
+    image_url = Column(String, nullable=True)
+
+    __table_args__ = (Index("ix_messages_archive_author_recipient_id", "author_id", "recipient_id", "id"),)
+
+
+class GroupMessageArchive(Base):
+    __tablename__ = "group_messages_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    group_id = Column(Integer, ForeignKey("groups.id"))
+    author_id = Column(Integer, ForeignKey("users.id"))
+    message = Column(Text, nullable=True)
+    timestamp = Column(DateTime(timezone=True), nullable=False)
+    status = Column(String(20))
+    image_url = Column(String, nullable=True)
+
+    __table_args__ = (Index("ix_group_messages_archive_group_id_id", "group_id", "id"),)
+
+
+class Conversation(Base):
+    __tablename__ = "conversations"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    peer_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    last_message_id = Column(Integer, nullable=True)
+    last_author_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    last_preview = Column(String(200), nullable=True)
+    last_image_url = Column(String, nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=False)
+    unread_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "peer_id", name="uq_conversations_user_peer"),
+        Index("ix_conversations_user_recent", "user_id", "last_message_at", "id"),
+    )
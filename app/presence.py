@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timezone
+from typing import Callable, Iterable
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import resume
+from app.database import AsyncSessionLocal
+from app.models import User
+
+logger = logging.getLogger(__name__)
+
+NODE_ID = os.getenv("NODE_ID") or f"{socket.gethostname()}:{os.getpid()}"
+PRESENCE_TTL = int(os.getenv("PRESENCE_TTL", 30))
+PRESENCE_HEARTBEAT_SECONDS = float(os.getenv("PRESENCE_HEARTBEAT_SECONDS", 10))
+LAST_SEEN_FLUSH_SECONDS = float(os.getenv("LAST_SEEN_FLUSH_SECONDS", 15))
+LAST_SEEN_FLUSH_BATCH = int(os.getenv("LAST_SEEN_FLUSH_BATCH", 500))
+
+ONLINE_KEY = "presence:online"
+LAST_SEEN_KEY = "presence:last_seen"
+DIRTY_KEY = "presence:dirty"
+
+# KEYS: user nodes zset, online zset, last_seen hash, dirty set
+# ARGV: node id, now, user id, last_seen iso
+MARK_OFFLINE_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+if redis.call('ZCARD', KEYS[1]) > 0 then
+    return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[3])
+redis.call('HSET', KEYS[3], ARGV[3], ARGV[4])
+redis.call('SADD', KEYS[4], ARGV[3])
+return 1
+"""
+
+# KEYS: dirty set, last_seen hash
+# ARGV: user id, flushed last_seen, ... (pairs)
+CLEAR_FLUSHED_SCRIPT = """
+local cleared = 0
+for i = 1, #ARGV, 2 do
+    if (redis.call('HGET', KEYS[2], ARGV[i]) or '') == ARGV[i + 1] then
+        cleared = cleared + redis.call('SREM', KEYS[1], ARGV[i])
+    end
+end
+return cleared
+"""
+
+
+def _text(value: bytes | str) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def user_key(user_id: int) -> str:
+    return f"presence:user:{user_id}"
+
+
+async def mark_online(redis, user_ids: Iterable[int]):
+    expires_at = time.time() + PRESENCE_TTL
+    pipe = redis.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.zadd(user_key(user_id), {NODE_ID: expires_at})
+        pipe.expire(user_key(user_id), PRESENCE_TTL)
+        pipe.zadd(ONLINE_KEY, {str(user_id): expires_at})
+    await pipe.execute()
+
+
+async def mark_offline(redis, user_id: int) -> str | None:
+    last_seen_iso = datetime.now(timezone.utc).isoformat()
+    keys = [user_key(user_id), ONLINE_KEY, LAST_SEEN_KEY, DIRTY_KEY]
+    offline = await redis.eval(MARK_OFFLINE_SCRIPT, len(keys), *keys, NODE_ID, time.time(), user_id, last_seen_iso)
+    return last_seen_iso if offline else None
+
+
+async def is_online(redis, user_id: int) -> bool:
+    expires_at = await redis.zscore(ONLINE_KEY, str(user_id))
+    return expires_at is not None and expires_at > time.time()
+
+
+async def online_users(redis) -> list[int]:
+    members = await redis.zrangebyscore(ONLINE_KEY, time.time(), "+inf")
+    return [int(member) for member in members]
+
+
+async def lookup(redis, user_ids: list[int]) -> dict[int, dict]:
+    if not user_ids:
+        return {}
+    pipe = redis.pipeline(transaction=False)
+    pipe.zmscore(ONLINE_KEY, [str(user_id) for user_id in user_ids])
+    pipe.hmget(LAST_SEEN_KEY, [str(user_id) for user_id in user_ids])
+    scores, last_seen = await pipe.execute()
+    now = time.time()
+    return {
+        user_id: {
+            "presence_status": "online" if score is not None and score > now else "offline",
+            "last_seen": _text(seen) if seen is not None else None,
+        }
+        for user_id, score, seen in zip(user_ids, scores, last_seen)
+    }
+
+
+async def heartbeat_loop(redis, local_users: Callable[[], Iterable[int]]):
+    while True:
+        try:
+            user_ids = list(local_users())
+            if user_ids:
+                await mark_online(redis, user_ids)
+                await resume.touch(redis, user_ids)
+            await redis.zremrangebyscore(ONLINE_KEY, "-inf", time.time())
+        except Exception:
+            logger.error("Presence heartbeat failed", exc_info=True)
+        await asyncio.sleep(PRESENCE_HEARTBEAT_SECONDS)
+
+
+async def flush_last_seen(redis) -> int:
+    # Ids stay dirty until the update commits, so a failed flush is retried on the next round.
+    user_ids = await redis.srandmember(DIRTY_KEY, LAST_SEEN_FLUSH_BATCH)
+    if not user_ids:
+        return 0
+    values = await redis.hmget(LAST_SEEN_KEY, user_ids)
+    rows = [
+        {"uid": int(user_id), "seen": datetime.fromisoformat(_text(seen))}
+        for user_id, seen in zip(user_ids, values)
+        if seen is not None
+    ]
+    if rows:
+        users = User.__table__
+        stmt = (
+            users.update()  # type: ignore
+            .where(users.c.id == bindparam("uid"))
+            .values(last_seen=bindparam("seen"), presence_status="offline")
+        )
+        async with AsyncSessionLocal() as db:
+            await db.execute(stmt, rows)
+            await db.commit()
+    # A user who went offline again meanwhile has a newer value and stays dirty.
+    flushed = [arg for user_id, seen in zip(user_ids, values) for arg in (_text(user_id), _text(seen or ""))]
+    await redis.eval(CLEAR_FLUSHED_SCRIPT, 2, DIRTY_KEY, LAST_SEEN_KEY, *flushed)
+    return len(user_ids)
+
+
+async def last_seen_flush_loop(redis):
+    while True:
+        await asyncio.sleep(LAST_SEEN_FLUSH_SECONDS)
+        try:
+            while await flush_last_seen(redis) >= LAST_SEEN_FLUSH_BATCH:
+                pass
+        except Exception:
+            logger.error("Flushing last_seen failed", exc_info=True)
+
+
+def start_presence_tasks(redis, local_users: Callable[[], Iterable[int]]) -> list[asyncio.Task]:
+    loop = asyncio.get_running_loop()
+    return [
+        loop.create_task(heartbeat_loop(redis, local_users)),
+        loop.create_task(last_seen_flush_loop(redis)),
+    ]
+
+
+async def snapshot(redis, db: AsyncSession, user_ids: list[int]) -> list[dict]:
+    statuses = await lookup(redis, user_ids) if redis else {}
+    missing = [uid for uid in user_ids if statuses.get(uid, {}).get("last_seen") is None]
+    if missing:
+        result = await db.execute(select(User.id, User.presence_status, User.last_seen).where(User.id.in_(missing)))
+        found = set()
+        for uid, presence_status, last_seen in result.all():
+            found.add(uid)
+            status = statuses.setdefault(uid, {"presence_status": presence_status})
+            status["last_seen"] = last_seen.isoformat() if last_seen else None
+        for uid in set(missing) - found:
+            statuses.pop(uid, None)
+    return [{"user_id": uid, **statuses[uid]} for uid in user_ids if uid in statuses]
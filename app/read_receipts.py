@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import os
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import conversations, history_cache, resume, unread
+from app.database import AsyncSessionLocal
+from app.models import Messages
+from app.redis_client import pipelined
+from app.utils.serialization import dumps
+from app.utils.user import get_username, user_channel
+
+logger = logging.getLogger(__name__)
+
+READ_DEBOUNCE_MS = float(os.getenv("READ_DEBOUNCE_MS", 300))
+
+
+async def mark_read_up_to(db: AsyncSession, redis, reader_id: int, peer_id: int, up_to: int) -> int:
+    messages = Messages.__table__
+    result = await db.execute(
+        messages.update()  # type: ignore
+        .where(
+            messages.c.recipient_id == reader_id,
+            messages.c.author_id == peer_id,
+            messages.c.id <= up_to,
+            messages.c.status != "read",
+        )
+        .values(status="read")
+    )
+    marked = result.rowcount or 0  # type: ignore
+    if marked:
+        await conversations.mark_read(db, reader_id, peer_id, marked)
+    await db.commit()
+    if marked and redis:
+        payload = {
+            "type": "read_receipt",
+            "reader_id": reader_id,
+            "reader_name": await get_username(reader_id, db),
+            "author_id": peer_id,
+            "up_to": up_to,
+            "message_id": up_to,
+        }
+        async with pipelined(redis) as pipe:
+            unread.queue_decr_direct(pipe, reader_id, peer_id, marked)
+            history_cache.queue_mark_status(pipe, peer_id, reader_id, "read", up_to)
+            resume.queue_record_publish(pipe, peer_id, user_channel(peer_id), dumps(payload))
+    return marked
+
+
+class ReadCursorCoalescer:
+    def __init__(self, reader_id: int, redis, delay_ms: float = READ_DEBOUNCE_MS):
+        self.reader_id = reader_id
+        self.redis = redis
+        self.delay = delay_ms / 1000
+        self.cursors: dict[int, int] = {}
+        self.task: asyncio.Task | None = None
+        self.flushing = False
+        self.closing = False
+
+    def add(self, peer_id: int, up_to: int):
+        if up_to > self.cursors.get(peer_id, 0):
+            self.cursors[peer_id] = up_to
+        if not self.closing and (self.task is None or self.task.done()):
+            self.task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            return
+        self.flushing = True
+        try:
+            await self.flush()
+        finally:
+            self.flushing = False
+        # Cursors that arrived during the flush found this task still running and scheduled nothing.
+        if self.cursors and not self.closing:
+            self.task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def flush(self):
+        cursors, self.cursors = self.cursors, {}
+        if not cursors:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                for peer_id, up_to in cursors.items():
+                    await mark_read_up_to(db, self.redis, self.reader_id, peer_id, up_to)
+        except Exception:
+            logger.error("Failed to store read cursors", exc_info=True, extra={"user_id": self.reader_id})
+
+    async def close(self):
+        self.closing = True
+        task = self.task
+        if task and not task.done() and task is not asyncio.current_task():
+            # A flush in progress already holds its cursors, so it has to finish; only the wait is cut short.
+            if not self.flushing:
+                task.cancel()
+            await asyncio.wait([task])
+        await self.flush()
@@ -1,5 +1,7 @@
+import asyncio
 import logging
 import os
+from contextlib import asynccontextmanager
 from typing import AsyncIterator
 
 import redis.asyncio as aioredis
@@ -10,37 +12,101 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 redis_client: aioredis.Redis | None = None
+pubsub_client: aioredis.Redis | None = None
 
 host = os.getenv("REDIS_HOST", "localhost")
 port = int(os.getenv("REDIS_PORT", 6379))
 db = int(os.getenv("REDIS_DB", 0))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+REDIS_PUBSUB_MAX_CONNECTIONS = int(os.getenv("REDIS_PUBSUB_MAX_CONNECTIONS", 4))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 5))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 5))
+REDIS_STARTUP_RETRIES = int(os.getenv("REDIS_STARTUP_RETRIES", 5))
+
+
+def make_client(max_connections: int, socket_timeout: float | None = REDIS_SOCKET_TIMEOUT) -> aioredis.Redis:
+    pool = aioredis.BlockingConnectionPool(
+        host=host,
+        port=port,
+        db=db,
+        max_connections=max_connections,
+        timeout=REDIS_POOL_TIMEOUT,
+        socket_timeout=socket_timeout,
+        socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+    )
+    return aioredis.Redis(connection_pool=pool)
+
+
+async def wait_for_redis(client: aioredis.Redis):
+    for attempt in range(1, REDIS_STARTUP_RETRIES + 1):
+        try:
+            await client.ping()  # type: ignore
+            return
+        except Exception:
+            logger.warning("Redis ping failed", extra={"attempt": attempt})
+            if attempt == REDIS_STARTUP_RETRIES:
+                logger.error("Redis unavailable during startup", exc_info=True)
+                raise RuntimeError("Redis is unavailable during startup")
+            await asyncio.sleep(min(2 ** (attempt - 1), 10))
 
 
 async def init_redis(app: FastAPI):
-    global redis_client
+    global redis_client, pubsub_client
 
-    redis_client = aioredis.Redis(host=host, port=port, db=db)
-    try:
-        redis_client.ping()
-    except Exception:
-        logger.error("Redis unavailable during startup", exc_info=True)
-        raise RuntimeError("Redis is unavailable during startup")
+    redis_client = make_client(REDIS_MAX_CONNECTIONS)
+    # Subscriber reads block until an event arrives, so they must not time out.
+    pubsub_client = make_client(REDIS_PUBSUB_MAX_CONNECTIONS, socket_timeout=None)
+    await wait_for_redis(redis_client)
 
     app.state.redis = redis_client
+    app.state.redis_pubsub = pubsub_client
 
 
 async def close_redis(app: FastAPI):
-    global redis_client
-    if redis_client:
-        try:
-            await redis_client.close()
-            await redis_client.connection_pool.disconnect()
-        except Exception:
-            logger.error("Redis error during shutdown", exc_info=True)
-            pass
-        redis_client = None
-        app.state.redis = None
+    global redis_client, pubsub_client
+    for client in (redis_client, pubsub_client):
+        if client:
+            try:
+                await client.aclose()
+                await client.connection_pool.disconnect()
+            except Exception:
+                logger.error("Redis error during shutdown", exc_info=True)
+                pass
+    redis_client = None
+    pubsub_client = None
+    app.state.redis = None
+    app.state.redis_pubsub = None
 
 
 async def get_redis() -> AsyncIterator[aioredis.Redis]:
     yield redis_client  # type: ignore
+
+
+@asynccontextmanager
+async def pipelined(redis):
+    # Queue a message's side effects on one pipeline and send them in a single round-trip.
+    pipe = redis.pipeline(transaction=False)
+    yield pipe
+    await pipe.execute()
+
+
+def pool_stats(client: aioredis.Redis | None) -> dict:
+    if client is None:
+        return {}
+    pool = client.connection_pool
+    return {
+        "max_connections": pool.max_connections,
+        "in_use": len(pool._in_use_connections),  # type: ignore
+        "idle": len(pool._available_connections),  # type: ignore
+    }
+
+
+async def health(client: aioredis.Redis | None) -> dict:
+    if client is None:
+        return {"status": "disabled"}
+    start = asyncio.get_running_loop().time()
+    try:
+        await client.ping()  # type: ignore
+    except Exception as e:
+        return {"status": "down", "error": str(e)}
+    return {"status": "ok", "latency_ms": round((asyncio.get_running_loop().time() - start) * 1000, 3)}
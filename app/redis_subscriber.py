@@ -1,81 +1,101 @@
 import asyncio
-import json
 import logging
 from typing import Any
 
 from redis.asyncio.client import Redis
-from sqlalchemy import select
 
-from app.database import get_db
-from app.models import GroupMember
-from app.routers.ws import CHAT_CHANNEL, PRESENCE_CHANNEL, READ_CHANNEL, manager
+from app import event_bus
+from app.dispatcher import Dispatcher
+from app.routers.ws import PRESENCE_CHANNEL, manager
+from app.utils.serialization import dumps, loads
+from app.utils.user import USER_CHANNEL, invalidate_user
 
 logger = logging.getLogger(__name__)
 
 
-async def handle_pub_messages(msg: dict[str, Any]):
+async def handle_pub_messages(msg: dict[str, Any], frame: str | None = None):
+    frame = frame or dumps(msg)
     typ = msg.get("type")
     if typ == "message":
         recipient = msg.get("recipient_id")
         if recipient and manager.is_online(recipient):
-            await manager.send_json_to(recipient, msg)
+            manager.send_frame_to(recipient, frame)
     elif typ == "presence":
         user_id = msg.get("user_id")
         if user_id:
-            await manager.broadcast_except(user_id, msg)
+            manager.push_presence(user_id, frame)
     elif typ == "read_receipt":
         author_id = msg.get("author_id")
         if author_id and manager.is_online(author_id):
-            await manager.send_json_to(author_id, msg)
+            manager.send_frame_to(author_id, frame)
+    elif typ == "group_member_added":
+        user_id = msg.get("user_id")
+        if user_id and manager.is_online(user_id):
+            manager.join_room(msg.get("group_id"), user_id)  # type: ignore
+            manager.send_frame_to(user_id, frame)
+    elif typ == "user_invalidate":
+        user_id = msg.get("user_id")
+        if user_id:
+            invalidate_user(user_id)
+
+
+async def handle_group_message(msg: dict[str, Any], frame: str | None = None):
+    frame = frame or dumps(msg)
+    group_id = msg.get("group_id")
+    # The added member hears about it on their own channel, which also joins them to the room.
+    skip = msg.get("user_id") if msg.get("type") == "group_member_added" else None
+    for m_id in manager.room_members(group_id):  # type: ignore
+        if m_id != skip:
+            manager.send_frame_to(m_id, frame)
+
+
+async def route(channel: str, payload: dict[str, Any], frame: str):
+    if channel.startswith("group:"):
+        await handle_group_message(payload, frame)
+    else:
+        await handle_pub_messages(payload, frame)
+
+
+def partition_key(channel: str, payload: dict[str, Any]) -> str:
+    # user:<id> and group:<id> already name one conversation; shared channels are split by user.
+    if channel.startswith(("user:", "group:")):
+        return channel
+    return f"{channel}:{payload.get('user_id')}"
+
+
+dispatcher = Dispatcher(route)
 
 
 async def subscriber_loop(redis: Redis, channels: list[str]):
-    pubsub = redis.pubsub()
+    pubsub = event_bus.subscription(redis)
     await pubsub.subscribe(*channels)
-    await pubsub.psubscribe("group:*")
+    manager.pubsub = pubsub
+    manager.channels = set()
+    manager.resync_channels()
+    dispatcher.start()
+    if isinstance(pubsub, event_bus.StreamSubscription):
+        pubsub.drain = dispatcher.join
     try:
         async for raw in pubsub.listen():
             if raw is None:
                 continue
-            msg_type = raw.get("type")
             data = raw.get("data")
-            if msg_type not in ("message", "pmessage"):
+            if raw.get("type") != "message":
+                continue
+            if isinstance(data, (bytes, bytearray)):
+                frame = data.decode()
+            elif isinstance(data, str):
+                frame = data
+            else:
                 continue
-            if msg_type == "pmessage":
-                if isinstance(data, (bytes, bytearray)):
-                    payload = json.loads(data.decode())
-                else:
-                    payload = json.loads(data)
-                group_id = payload.get("group_id")
-                gen = get_db()
-                try:
-                    db = await gen.__anext__()
-                    result = await db.execute(select(GroupMember.user_id).where(GroupMember.group_id == group_id))
-                    members = result.scalars().all()
-                    if not members:
-                        continue
-                    for m_id in members:
-                        if manager.is_online(m_id):
-                            await manager.send_json_to(m_id, payload=payload)
-                except Exception:
-                    continue
-                finally:
-                    await gen.aclose()  # type: ignore
+            try:
+                payload = loads(frame)
+            except Exception:
                 continue
-            if msg_type == "message":
-                if isinstance(data, (bytes, bytearray)):
-                    try:
-                        payload = json.loads(data.decode())
-                    except Exception:
-                        continue
-                elif isinstance(data, str):
-                    try:
-                        payload = json.loads(data)
-                    except Exception:
-                        continue
-                else:
-                    continue
-                await handle_pub_messages(payload)
+            channel = raw.get("channel")
+            if isinstance(channel, (bytes, bytearray)):
+                channel = channel.decode()
+            await dispatcher.submit(partition_key(channel, payload), channel, payload, frame)
     except asyncio.CancelledError:
         try:
             await pubsub.unsubscribe()
@@ -85,6 +105,9 @@ async def subscriber_loop(redis: Redis, channels: list[str]):
             pass
         raise
     finally:
+        await dispatcher.stop()
+        manager.pubsub = None
+        manager.channels = set()
         try:
             await pubsub.unsubscribe()
             await pubsub.close()
@@ -94,7 +117,7 @@ async def subscriber_loop(redis: Redis, channels: list[str]):
 
 
 async def start_redis_listener(
-    redis: Redis, *, channels: tuple[str, ...] = (CHAT_CHANNEL, PRESENCE_CHANNEL, READ_CHANNEL)
+    redis: Redis, *, channels: tuple[str, ...] = (PRESENCE_CHANNEL, USER_CHANNEL)
 ) -> asyncio.Task:
     loop = asyncio.get_running_loop()
     task = loop.create_task(subscriber_loop(redis, list(channels)))
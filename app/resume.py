@@ -0,0 +1,87 @@
+import os
+from typing import Iterable
+
+from app import event_bus
+
+RESUME_BUFFER_SIZE = int(os.getenv("RESUME_BUFFER_SIZE", 500))
+RESUME_TTL = int(os.getenv("RESUME_TTL", 120))
+
+# Stamps the frame with the user's next seq, buffers it and publishes it, all in one call.
+# KEYS: user's seq counter, user's event buffer, channel stream
+# ARGV: frame, buffer size, ttl, channel, "streams" or "pubsub", stream maxlen, stream ttl
+RECORD_PUBLISH_SCRIPT = """
+local frame = ARGV[1]
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    local seq = redis.call('INCR', KEYS[1])
+    frame = '{"seq":' .. seq .. ',' .. string.sub(frame, 2)
+    redis.call('RPUSH', KEYS[2], frame)
+    redis.call('LTRIM', KEYS[2], -tonumber(ARGV[2]), -1)
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    redis.call('EXPIRE', KEYS[2], ARGV[3])
+end
+if ARGV[5] == 'streams' then
+    redis.call('XADD', KEYS[3], 'MAXLEN', '~', ARGV[6], '*', 'data', frame)
+    redis.call('EXPIRE', KEYS[3], ARGV[7])
+else
+    redis.call('PUBLISH', ARGV[4], frame)
+end
+return 1
+"""
+
+
+def seq_key(user_id: int) -> str:
+    return f"resume:seq:{user_id}"
+
+
+def buffer_key(user_id: int) -> str:
+    return f"resume:buf:{user_id}"
+
+
+async def open_session(redis, user_id: int) -> tuple[int, bool]:
+    pipe = redis.pipeline(transaction=True)
+    pipe.set(seq_key(user_id), 0, nx=True, ex=RESUME_TTL)
+    pipe.expire(seq_key(user_id), RESUME_TTL)
+    pipe.expire(buffer_key(user_id), RESUME_TTL)
+    pipe.get(seq_key(user_id))
+    results = await pipe.execute()
+    return int(results[-1] or 0), bool(results[0])
+
+
+async def touch(redis, user_ids: Iterable[int]):
+    pipe = redis.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.expire(seq_key(user_id), RESUME_TTL)
+        pipe.expire(buffer_key(user_id), RESUME_TTL)
+    await pipe.execute()
+
+
+def queue_record_publish(pipe, user_id: int, channel: str, frame: str):
+    keys = [seq_key(user_id), buffer_key(user_id), event_bus.stream_key(channel)]
+    args = [
+        frame,
+        RESUME_BUFFER_SIZE,
+        RESUME_TTL,
+        channel,
+        event_bus.EVENT_BUS,
+        event_bus.EVENT_STREAM_MAXLEN,
+        event_bus.EVENT_STREAM_TTL,
+    ]
+    pipe.eval(RECORD_PUBLISH_SCRIPT, len(keys), *keys, *args)
+
+
+def gap(current: int, frames: list[str], resume_from: int) -> list[str] | None:
+    first = current - len(frames) + 1
+    if resume_from > current or resume_from < first - 1:
+        return None
+    start = resume_from - first + 1
+    return frames[start:]
+
+
+async def since(redis, user_id: int, resume_from: int) -> list[str] | None:
+    pipe = redis.pipeline(transaction=True)
+    pipe.get(seq_key(user_id))
+    pipe.lrange(buffer_key(user_id), 0, -1)
+    current, frames = await pipe.execute()
+    if current is None:
+        return None
+    return gap(int(current), [f.decode() if isinstance(f, bytes) else f for f in frames], resume_from)
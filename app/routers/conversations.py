@@ -0,0 +1,128 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import and_, func, literal, select, tuple_, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth_service import get_current_user
+from app.database import get_read_db
+from app.models import Conversation, Group, GroupMember, GroupMessage, User
+from app.utils.pagination import MAX_PAGE_SIZE, PAGE_SIZE, decode_token, encode_token
+
+router = APIRouter(prefix="/conversations", tags=["conversations"])
+
+KINDS = ("direct", "group")
+
+
+def decode_position(cursor: str) -> tuple[datetime, str, int]:
+    data = decode_token(cursor)
+    try:
+        if data["kind"] not in KINDS:
+            raise ValueError(data["kind"])
+        return datetime.fromisoformat(data["at"]), data["kind"], int(data["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def summaries(user_id: int):
+    direct = (
+        select(
+            literal("direct").label("kind"),
+            Conversation.peer_id,
+            User.username.label("name"),
+            Conversation.last_message_id,
+            Conversation.last_author_id,
+            Conversation.last_preview,
+            Conversation.last_image_url,
+            Conversation.last_message_at.label("last_at"),
+            Conversation.unread_count,
+        )
+        .join(User, User.id == Conversation.peer_id)
+        .where(Conversation.user_id == user_id)
+    )
+    # Groups keep one summary row each; a group the user has only joined sorts by the join time.
+    group = (
+        select(
+            literal("group").label("kind"),
+            Group.id.label("peer_id"),
+            Group.name.label("name"),
+            Group.last_message_id,
+            Group.last_author_id,
+            Group.last_preview,
+            Group.last_image_url,
+            func.coalesce(Group.last_message_at, GroupMember.joined_at).label("last_at"),
+            literal(0).label("unread_count"),
+        )
+        .join(GroupMember, GroupMember.group_id == Group.id)
+        .where(GroupMember.user_id == user_id)
+    )
+    return union_all(direct, group).subquery()
+
+
+async def group_unread(db: AsyncSession, user_id: int, group_ids: list[int]) -> dict[int, int]:
+    if not group_ids:
+        return {}
+    result = await db.execute(
+        select(GroupMember.group_id, func.count(GroupMessage.id))
+        .join(
+            GroupMessage,
+            and_(
+                GroupMessage.group_id == GroupMember.group_id,
+                GroupMessage.id > func.coalesce(GroupMember.last_read_message_id, 0),
+                GroupMessage.author_id != user_id,
+            ),
+        )
+        .where(GroupMember.user_id == user_id, GroupMember.group_id.in_(group_ids))
+        .group_by(GroupMember.group_id)
+    )
+    return {gid: count for gid, count in result.all()}
+
+
+@router.get("")
+async def list_conversations(
+    cursor: str | None = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    chats = summaries(user.id)
+    query = select(chats)
+    if cursor:
+        at, kind, peer_id = decode_position(cursor)
+        position = tuple_(chats.c.last_at, chats.c.kind, chats.c.peer_id)
+        query = query.where(position < tuple_(literal(at), literal(kind), literal(peer_id)))
+    # DMs come off ix_conversations_user_recent and groups off the caller's memberships.
+    result = await db.execute(
+        query.order_by(chats.c.last_at.desc(), chats.c.kind.desc(), chats.c.peer_id.desc()).limit(limit + 1)
+    )
+    rows = list(result.all())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_token({"at": last.last_at.isoformat(), "kind": last.kind, "id": last.peer_id})
+    # Group unread counts are derived from read markers, only for the groups on this page.
+    unread = await group_unread(db, user.id, [row.peer_id for row in rows if row.kind == "group"])
+    items = [
+        {
+            "kind": row.kind,
+            "peer_id": row.peer_id,
+            "name": row.name,
+            "last_message": (
+                {
+                    "message_id": row.last_message_id,
+                    "author_id": row.last_author_id,
+                    "preview": row.last_preview,
+                    "image_url": row.last_image_url,
+                }
+                if row.last_message_id is not None
+                else None
+            ),
+            "last_activity": row.last_at.isoformat(),
+            "unread_count": unread.get(row.peer_id, 0) if row.kind == "group" else row.unread_count,
+        }
+        for row in rows
+    ]
+    return {"conversations": items, "next_cursor": next_cursor}
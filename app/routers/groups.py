@@ -1,19 +1,32 @@
 import logging
+import os
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, ConfigDict
-from sqlalchemy import select
+from sqlalchemy import select, union_all
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
+from app import event_bus, history_cache, resume
 from app.auth_service import get_current_user
-from app.database import get_db
-from app.models import Group, GroupMember, GroupMessage, User
+from app.database import AsyncSessionLocal, get_db, get_read_db
+from app.models import Group, GroupMember, GroupMessage, GroupMessageArchive, User
+from app.redis_client import get_redis, pipelined
+from app.routers.ws import manager
+from app.utils.cache import TTLCache
+from app.utils.pagination import MAX_PAGE_SIZE, PAGE_SIZE, encode_cursor, resolve_page
+from app.utils.serialization import dumps
+from app.utils.user import get_usernames, user_channel
 
 router = APIRouter(prefix="/groups", tags=["groups"])
 
 logger = logging.getLogger(__name__)
 
+MEMBERSHIP_CACHE_SIZE = int(os.getenv("MEMBERSHIP_CACHE_SIZE", 50000))
+MEMBERSHIP_CACHE_TTL = float(os.getenv("MEMBERSHIP_CACHE_TTL", 600))
+membership_cache = TTLCache[tuple[int, int], bool](maxsize=MEMBERSHIP_CACHE_SIZE, ttl=MEMBERSHIP_CACHE_TTL)
+# Groups cannot be renamed, so names are cached alongside memberships.
+group_names = TTLCache[int, str](maxsize=MEMBERSHIP_CACHE_SIZE, ttl=MEMBERSHIP_CACHE_TTL)
+
 
 class GroupOut(BaseModel):
     id: int
@@ -22,8 +35,21 @@ class GroupOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+async def announce_member(redis, group_id: int, user_id: int):
+    membership_cache.set((group_id, user_id), True)
+    manager.join_room(group_id, user_id)
+    if redis:
+        payload = {"type": "group_member_added", "group_id": group_id, "user_id": user_id}
+        frame = dumps(payload)
+        async with pipelined(redis) as pipe:
+            event_bus.queue_publish(pipe, f"group:{group_id}", frame)
+            resume.queue_record_publish(pipe, user_id, user_channel(user_id), frame)
+
+
 @router.post("/create-group")
-async def create_group(name: str, user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def create_group(
+    name: str, user=Depends(get_current_user), db: AsyncSession = Depends(get_db), redis=Depends(get_redis)
+):
     if not name.strip():
         logger.warning("Group name not provided", exc_info=True)
         raise HTTPException(400, "Group name not provided")
@@ -41,12 +67,13 @@ async def create_group(name: str, user=Depends(get_current_user), db: AsyncSessi
     db.add(group_creator)
     await db.commit()
     await db.refresh(group_creator)
+    await announce_member(redis, group.id, user_id)  # type: ignore
     logger.info("Group created successfully", extra={"group_id": group.id, "creator": user_id})
     return {"Success": "Group Created", "group_id": group.id}
 
 
 @router.post("/{group_id}/add-member")
-async def add_member(group_id: int, user_id: int, db: AsyncSession = Depends(get_db)):
+async def add_member(group_id: int, user_id: int, db: AsyncSession = Depends(get_db), redis=Depends(get_redis)):
     result = await db.execute(select(Group).where(Group.id == group_id))
     group = result.scalar_one_or_none()
     if not group:
@@ -61,42 +88,123 @@ async def add_member(group_id: int, user_id: int, db: AsyncSession = Depends(get
     db.add(group_member)
     await db.commit()
     await db.refresh(group_member)
+    await announce_member(redis, group.id, user.id)  # type: ignore
     logger.info("User added to the group", extra={"user_id": user.id, "group_id": group.id})
     return {"Success": "User added to the group"}
 
 
 @router.get("/all", response_model=list[GroupOut])
-async def get_groups(db: AsyncSession = Depends(get_db)):
+async def get_groups(db: AsyncSession = Depends(get_read_db)):
     result = await db.execute(select(Group))
     groups = result.scalars().all()
     return groups
 
 
-@router.get("/{group_id}/messages")
-async def get_group_messages(group_id: int, db: AsyncSession = Depends(get_db), user=Depends(get_current_user)):
+async def is_member(db: AsyncSession, group_id: int, user_id: int) -> bool:
+    if membership_cache.get((group_id, user_id)):
+        return True
     result = await db.execute(
-        select(GroupMessage)
-        .options(
-            selectinload(GroupMessage.author),
-            selectinload(GroupMessage.group),
-        )
-        .where(GroupMessage.group_id == group_id)
-        .order_by(GroupMessage.id.asc())
+        select(GroupMember.user_id).where(GroupMember.group_id == group_id, GroupMember.user_id == user_id)
     )
-    grp_msgs = result.scalars().all()
-    output = []
-
-    for m in grp_msgs:
-        output.append(
-            {
-                "group_id": m.group_id,
-                "group_name": m.group.name,
-                "author_id": m.author_id,
-                "author_name": m.author.username,
-                "message": m.message,
-                "image_url": m.image_url,
-                "timestamp": m.timestamp.isoformat(),
-            }
+    if result.scalar_one_or_none() is None:
+        return False
+    # Only memberships are cached: there is no way to leave a group, so they cannot go stale.
+    membership_cache.set((group_id, user_id), True)
+    return True
+
+
+async def group_history(
+    db: AsyncSession, group_id: int, before_id: int | None, after_id: int | None, limit: int
+) -> tuple[list[dict], bool]:
+    newest_first = after_id is None
+    sides = []
+    for model in (GroupMessage, GroupMessageArchive):
+        query = select(model.id, model.author_id, model.message, model.image_url, model.timestamp).where(
+            model.group_id == group_id
         )
+        if before_id is not None:
+            query = query.where(model.id < before_id)
+        if after_id is not None:
+            query = query.where(model.id > after_id)
+        sides.append(query.order_by(model.id.desc() if newest_first else model.id.asc()).limit(limit + 1).subquery())
+    both = union_all(*(select(side) for side in sides)).subquery()
+    result = await db.execute(
+        select(both).order_by(both.c.id.desc() if newest_first else both.c.id.asc()).limit(limit + 1)
+    )
+    rows = list(result.all())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if newest_first:
+        rows.reverse()
+
+    names = await get_usernames({m.author_id for m in rows}, db)
+    messages = [
+        {
+            "message_id": m.id,
+            "author_id": m.author_id,
+            "author_name": names.get(m.author_id),
+            "message": m.message,
+            "image_url": m.image_url,
+            "timestamp": m.timestamp.isoformat(),
+        }
+        for m in rows
+    ]
+    return messages, has_more
+
+
+async def group_name(db: AsyncSession, group_id: int) -> str | None:
+    name = group_names.get(group_id)
+    if name is None:
+        result = await db.execute(select(Group.name).where(Group.id == group_id))
+        name = result.scalar_one_or_none()
+        if name is not None:
+            group_names.set(group_id, name)
+    return name
+
 
-    return output
+@router.get("/{group_id}/messages")
+async def get_group_messages(
+    group_id: int,
+    before_id: int | None = None,
+    after_id: int | None = None,
+    cursor: str | None = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
+    user=Depends(get_current_user),
+    redis=Depends(get_redis),
+):
+    if not await is_member(db, group_id, user.id):
+        raise HTTPException(403, "Not a member of this group")
+    before_id, after_id = resolve_page(cursor, before_id, after_id)
+    group = {"id": group_id, "name": await group_name(db, group_id)}
+    key = history_cache.group_key(group_id)
+    cached = history_cache.cacheable(redis, limit, before_id, after_id)
+    if cached:
+        page = await history_cache.first_page(redis, key, limit)
+        if page is not None:
+            messages, has_more = page
+            next_cursor = encode_cursor("before", messages[0]["message_id"]) if has_more else None
+            return {"group": group, "messages": messages, "next_cursor": next_cursor}
+        seen = await history_cache.generation(redis, key)
+
+    if cached:
+        # Warmed from the primary so replica lag cannot leave a hole in the cached list.
+        async with AsyncSessionLocal() as primary:
+            messages, has_more = await group_history(
+                primary, group_id, before_id, after_id, history_cache.HISTORY_CACHE_SIZE
+            )
+        await history_cache.warm(redis, key, seen, messages, history_cache.GROUP_FIELDS)
+        has_more = has_more or len(messages) > limit
+        messages = messages[-limit:]
+    else:
+        messages, has_more = await group_history(db, group_id, before_id, after_id, limit)
+
+    next_cursor = None
+    if has_more:
+        newest_first = after_id is None
+        next_cursor = (
+            encode_cursor("before", messages[0]["message_id"])
+            if newest_first
+            else encode_cursor("after", messages[-1]["message_id"])
+        )
+    return {"group": group, "messages": messages, "next_cursor": next_cursor}
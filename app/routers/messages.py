@@ -1,14 +1,17 @@
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
-from sqlalchemy import and_, or_, select
+from sqlalchemy import select, union_all
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
+from app import conversations, history_cache, unread
 from app.auth_service import get_current_user
-from app.database import get_db
-from app.models import Messages, User
+from app.database import AsyncSessionLocal, get_db, get_read_db
+from app.models import GroupMember, MessageArchive, Messages, User
+from app.redis_client import get_redis, pipelined
+from app.utils.pagination import MAX_PAGE_SIZE, PAGE_SIZE, encode_cursor, resolve_page
+from app.utils.user import get_usernames
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
@@ -21,7 +24,9 @@ class MessageCreate(BaseModel):
 
 
 @router.post("/send")
-async def send_message(data: MessageCreate, author=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def send_message(
+    data: MessageCreate, author=Depends(get_current_user), db: AsyncSession = Depends(get_db), redis=Depends(get_redis)
+):
     if not data.message:
         logger.warning("Invalid message", exc_info=True)
         raise HTTPException(400, "Invalid Message")
@@ -39,8 +44,39 @@ async def send_message(data: MessageCreate, author=Depends(get_current_user), db
         message=data.message,
     )
     db.add(message_sent)
+    await db.flush()
+    await conversations.record_direct(
+        db,
+        [
+            {
+                "id": message_sent.id,
+                "author_id": author.id,
+                "recipient_id": data.recipient_id,
+                "message": data.message,
+                "timestamp": message_sent.timestamp,
+            }
+        ],
+    )
     await db.commit()
     await db.refresh(message_sent)
+    if redis:
+        item = {
+            "message_id": message_sent.id,
+            "author_id": author.id,
+            "recipient_id": data.recipient_id,
+            "author_name": author.username,
+            "recipient_name": recipient.username,
+            "message": message_sent.message,
+            "timestamp": message_sent.timestamp.isoformat(),
+            "status": message_sent.status,
+        }
+        async with pipelined(redis) as pipe:
+            unread.queue_incr_direct(pipe, data.recipient_id, author.id)
+            history_cache.queue_append(
+                pipe,
+                history_cache.direct_key(author.id, data.recipient_id),
+                history_cache.entry(item, history_cache.DIRECT_FIELDS),
+            )
     logger.info("Message sent")
     return {
         "author_id": author.id,
@@ -51,7 +87,7 @@ async def send_message(data: MessageCreate, author=Depends(get_current_user), db
 
 
 @router.get("/inbox")
-async def inbox(user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def inbox(user=Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
     result = await db.execute(select(Messages).where(Messages.recipient_id == user.id))
     message = result.scalars().all()
     if not message:
@@ -60,7 +96,7 @@ async def inbox(user=Depends(get_current_user), db: AsyncSession = Depends(get_d
 
 
 @router.get("/sent")
-async def sent_messages(user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def sent_messages(user=Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
     result = await db.execute(select(Messages).where(Messages.author_id == user.id))
     message = result.scalars().all()
     if not message:
@@ -68,38 +104,115 @@ async def sent_messages(user=Depends(get_current_user), db: AsyncSession = Depen
     return message
 
 
-@router.get("/{recipient_id}")
-async def get_direct_messages(recipient_id: int, user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    me_id = user.id
+@router.get("/unread")
+async def unread_counts(user=Depends(get_current_user), db: AsyncSession = Depends(get_db), redis=Depends(get_redis)):
+    if not redis:
+        return (await unread.counts_from_db(db, [user.id]))[user.id]
+    result = await db.execute(select(GroupMember.group_id).where(GroupMember.user_id == user.id))
+    return await unread.summary(redis, user.id, list(result.scalars().all()))
+
+
+def conversation_side(
+    model, author_id: int, recipient_id: int, before_id: int | None, after_id: int | None, limit: int
+):
+    query = select(
+        model.id,
+        model.author_id,
+        model.recipient_id,
+        model.message,
+        model.image_url,
+        model.timestamp,
+        model.status,
+    ).where(model.author_id == author_id, model.recipient_id == recipient_id)
+    if before_id is not None:
+        query = query.where(model.id < before_id)
+    if after_id is not None:
+        query = query.where(model.id > after_id)
+    # Each side is one range scan on the (author_id, recipient_id, id) index of its table.
+    return query.order_by(model.id.asc() if after_id is not None else model.id.desc()).limit(limit).subquery()
+
+
+async def direct_history(
+    db: AsyncSession, me_id: int, peer_id: int, before_id: int | None, after_id: int | None, limit: int
+) -> tuple[list[dict], bool]:
+    sides = [
+        conversation_side(model, author_id, recipient_id, before_id, after_id, limit + 1)
+        for model in (Messages, MessageArchive)
+        for author_id, recipient_id in ((me_id, peer_id), (peer_id, me_id))
+    ]
+    both = union_all(*(select(side) for side in sides)).subquery()
+    newest_first = after_id is None
     result = await db.execute(
-        select(Messages)
-        .options(
-            selectinload(Messages.author),
-            selectinload(Messages.recipient),
-        )
-        .where(
-            or_(
-                and_(Messages.author_id == me_id, Messages.recipient_id == recipient_id),
-                and_(Messages.author_id == recipient_id, Messages.recipient_id == me_id),
-            )
-        )
-        .order_by(Messages.id.asc())
+        select(both).order_by(both.c.id.desc() if newest_first else both.c.id.asc()).limit(limit + 1)
     )
+    rows = list(result.all())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if newest_first:
+        rows.reverse()
 
-    msgs = result.scalars().all()
-    output = []
-    for m in msgs:
-        output.append(
-            {
-                "message_id": m.id,
-                "author_id": m.author_id,
-                "recipient_id": m.recipient_id,
-                "author_name": m.author.username,
-                "recipient_name": m.recipient.username,
-                "message": m.message,
-                "image_url": m.image_url,
-                "timestamp": m.timestamp.isoformat(),
-                "status": m.status,
+    names = await get_usernames((me_id, peer_id), db)
+    output = [
+        {
+            "message_id": m.id,
+            "author_id": m.author_id,
+            "recipient_id": m.recipient_id,
+            "author_name": names.get(m.author_id),
+            "recipient_name": names.get(m.recipient_id),
+            "message": m.message,
+            "image_url": m.image_url,
+            "timestamp": m.timestamp.isoformat(),
+            "status": m.status,
+        }
+        for m in rows
+    ]
+    return output, has_more
+
+
+@router.get("/{recipient_id}")
+async def get_direct_messages(
+    recipient_id: int,
+    before_id: int | None = None,
+    after_id: int | None = None,
+    cursor: str | None = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+    redis=Depends(get_redis),
+):
+    me_id = user.id
+    before_id, after_id = resolve_page(cursor, before_id, after_id)
+    key = history_cache.direct_key(me_id, recipient_id)
+    cached = history_cache.cacheable(redis, limit, before_id, after_id)
+    if cached:
+        page = await history_cache.first_page(redis, key, limit)
+        if page is not None:
+            output, has_more = page
+            return {
+                "messages": output,
+                "next_cursor": encode_cursor("before", output[0]["message_id"]) if has_more else None,
             }
+        seen = await history_cache.generation(redis, key)
+
+    if cached:
+        # A miss loads a full cache's worth so the next open is served from Redis. It reads the
+        # primary: a message still on its way to the replica would be missing from the list for good.
+        async with AsyncSessionLocal() as primary:
+            output, has_more = await direct_history(
+                primary, me_id, recipient_id, before_id, after_id, history_cache.HISTORY_CACHE_SIZE
+            )
+        await history_cache.warm(redis, key, seen, output, history_cache.DIRECT_FIELDS)
+        has_more = has_more or len(output) > limit
+        output = output[-limit:]
+    else:
+        output, has_more = await direct_history(db, me_id, recipient_id, before_id, after_id, limit)
+
+    next_cursor = None
+    if has_more:
+        newest_first = after_id is None
+        next_cursor = (
+            encode_cursor("before", output[0]["message_id"])
+            if newest_first
+            else encode_cursor("after", output[-1]["message_id"])
         )
-    return output
+    return {"messages": output, "next_cursor": next_cursor}
@@ -0,0 +1,59 @@
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import search as message_search
+from app.auth_service import get_current_user
+from app.database import get_read_db
+from app.utils.pagination import MAX_PAGE_SIZE, decode_token, encode_token
+from app.utils.user import get_usernames
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", 20))
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", 1000))
+
+
+def decode_offset(cursor: str | None) -> int:
+    if not cursor:
+        return 0
+    try:
+        return max(int(decode_token(cursor)["o"]), 0)
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("")
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: str | None = None,
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    offset = decode_offset(cursor)
+    # Ranked results cannot be keyset paged, so deep offsets are capped instead.
+    limit = min(limit, SEARCH_MAX_RESULTS - offset)
+    if limit <= 0:
+        return {"results": [], "next_cursor": None}
+    rows = await message_search.search(db, user.id, q, limit + 1, offset)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    names = await get_usernames({row["author_id"] for row in rows}, db)
+    results = [
+        {
+            "kind": row["kind"],
+            "message_id": row["id"],
+            "peer_id": row["peer_id"],
+            "author_id": row["author_id"],
+            "author_name": names.get(row["author_id"]),
+            "snippet": row["snippet"],
+            "timestamp": row["timestamp"].isoformat(),
+            "rank": round(float(row["rank"]), 6),
+        }
+        for row in rows
+    ]
+    next_cursor = encode_token({"o": offset + limit}) if has_more and offset + limit < SEARCH_MAX_RESULTS else None
+    return {"results": results, "next_cursor": next_cursor}
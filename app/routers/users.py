@@ -3,9 +3,11 @@ from pydantic import BaseModel, ConfigDict
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app import presence as presence_directory
 from app.auth_service import get_current_user
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models import User
+from app.redis_client import get_redis
 from app.routers.ws import manager
 
 router = APIRouter(prefix="/users", tags=["Users"])
@@ -24,22 +26,22 @@ async def me(user=Depends(get_current_user)):
 
 
 @router.get("/presence/{user_id}")
-async def presence(user_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
-    if not user:
+async def presence(user_id: int, db: AsyncSession = Depends(get_db), redis=Depends(get_redis)):
+    entries = await presence_directory.snapshot(redis, db, [user_id])
+    if not entries:
         raise HTTPException(400, "User not found")
-    last_seen_iso = user.last_seen.isoformat() if user.last_seen else None  # type: ignore
-    return {"user_id": user_id, "presence_status": user.presence_status, "last_seen": last_seen_iso}
+    return entries[0]
 
 
 @router.get("/online")
-async def online():
+async def online(redis=Depends(get_redis)):
+    if redis:
+        return {"online": await presence_directory.online_users(redis)}
     return {"online": list(manager.active.keys())}
 
 
 @router.get("/all", response_model=list[UserList])
-async def get_all_users(db: AsyncSession = Depends(get_db)):
+async def get_all_users(db: AsyncSession = Depends(get_read_db)):
     result = await db.execute(select(User))
     users = result.scalars().all()
     return users
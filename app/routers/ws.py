@@ -1,64 +1,294 @@
-import json
+import asyncio
 import logging
-from datetime import datetime, timezone
-from typing import Dict
+import os
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, Hashable, Iterable, Set
 
 import jwt
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
 from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
-from sqlalchemy import select
+from redis.asyncio.client import PubSub
+from sqlalchemy import case, func, select
 
+from app import conversations, event_bus, history_cache, presence, resume, unread
 from app.auth_service import ALGORITHM, SECRET_KEY
-from app.database import get_db
+from app.database import get_db, queue_mark_write
+from app.message_batcher import message_batcher
 from app.models import Group, GroupMember, GroupMessage, Messages, User
+from app.read_receipts import ReadCursorCoalescer
+from app.redis_client import pipelined
 from app.utils.rate_limit import check_rate_limit
-from app.utils.user import get_username
+from app.utils.serialization import dumps, loads
+from app.utils.user import get_username, get_usernames, user_channel
 
 router = APIRouter(prefix="/ws", tags=["websocket"])
 logger = logging.getLogger(__name__)
 
-CHAT_CHANNEL = "chat_messages"
 PRESENCE_CHANNEL = "presence"
-READ_CHANNEL = "read_receipt"
 
+SLOW_CONSUMER_POLICIES = ("drop", "coalesce", "disconnect")
+WS_OUTBOUND_QUEUE_SIZE = int(os.getenv("WS_OUTBOUND_QUEUE_SIZE", 256))
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop")
+PENDING_PAGE_SIZE = int(os.getenv("PENDING_PAGE_SIZE", 200))
+GROUP_CATCHUP_LIMIT = int(os.getenv("GROUP_CATCHUP_LIMIT", 50))
+PRESENCE_MAX_WATCH = int(os.getenv("PRESENCE_MAX_WATCH", 1000))
+PRESENCE_COALESCE_MS = float(os.getenv("PRESENCE_COALESCE_MS", 250))
+
+
+class Connection:
+    def __init__(self, manager: "ConnectionManager", user_id: int, websocket: WebSocket):
+        self.manager = manager
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue: Deque[tuple[Hashable | None, str]] = deque()
+        self.held: Deque[tuple[Hashable | None, str]] | None = None
+        self.dropped = 0
+        self.closing = False
+        self._ready = asyncio.Event()
+        self.writer: asyncio.Task | None = None
+
+    def start(self):
+        self.writer = asyncio.get_running_loop().create_task(self._write_loop())
+
+    def stop(self):
+        if self.writer and self.writer is not asyncio.current_task():
+            self.writer.cancel()
+
+    def hold(self):
+        # Fan-out waits here while catch-up runs, so live events never overtake the backlog.
+        self.held = deque()
+
+    def release(self):
+        held, self.held = self.held, None
+        for key, frame in held or ():
+            self.enqueue(frame, key)
+
+    async def send_text(self, frame: str):
+        # The handler's own frames go through the writer too, so a socket only ever has one writer.
+        # They skip the hold and the slow-consumer policy, and resolve once written.
+        if self.closing or self.writer is None or self.writer.done():
+            raise WebSocketDisconnect(status.WS_1006_ABNORMAL_CLOSURE)
+        written = asyncio.get_running_loop().create_future()
+        self.queue.append((written, frame))
+        self._ready.set()
+        await written
+
+    async def send_json(self, payload: dict):
+        await self.send_text(dumps(payload))
+
+    def enqueue(self, frame: str, key: Hashable | None = None) -> bool:
+        if self.closing:
+            return False
+        queue = self.queue if self.held is None else self.held
+        policy = self.manager.policy
+        if key is not None and policy == "coalesce":
+            for i, (queued_key, _) in enumerate(queue):
+                if queued_key == key:
+                    queue[i] = (key, frame)
+                    return True
+        if len(queue) >= self.manager.max_queue:
+            if policy == "disconnect":
+                self.closing = True
+                self.manager.slow_disconnects += 1
+                logger.warning("Disconnecting slow consumer", extra={"user_id": self.user_id})
+                self._ready.set()
+                return False
+            self.dropped += 1
+            self.manager.dropped += 1
+            if policy != "coalesce":
+                return False
+            for i, (queued_key, _) in enumerate(queue):
+                if not isinstance(queued_key, asyncio.Future):
+                    del queue[i]
+                    break
+        queue.append((key, frame))
+        if queue is self.queue:
+            self._ready.set()
+        return True
+
+    async def _write_loop(self):
+        current: Hashable | None = None
+        try:
+            while True:
+                await self._ready.wait()
+                while self.queue and not self.closing:
+                    current, frame = self.queue.popleft()
+                    await self.websocket.send_text(frame)
+                    if isinstance(current, asyncio.Future) and not current.done():
+                        current.set_result(None)
+                    current = None
+                self._ready.clear()
+                if self.closing:
+                    await self.websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.manager.forget(self)
+        finally:
+            for key in (current, *(key for key, _ in self.queue)):
+                if isinstance(key, asyncio.Future) and not key.done():
+                    key.set_exception(WebSocketDisconnect(status.WS_1006_ABNORMAL_CLOSURE))
 
-class ConnectionManager:
-    def __init__(self):
-        self.active: Dict[int, WebSocket] = {}  # type: ignore
 
-    async def connect(self, user_id: int, websocket: WebSocket, username):
+class ConnectionManager:
+    def __init__(self, max_queue: int = WS_OUTBOUND_QUEUE_SIZE, policy: str = WS_SLOW_CONSUMER_POLICY):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {policy}")
+        self.max_queue = max_queue
+        self.policy = policy
+        self.dropped = 0
+        self.slow_disconnects = 0
+        self.active: Dict[int, Connection] = {}
+        self.rooms: Dict[int, Set[int]] = {}
+        self.user_rooms: Dict[int, Set[int]] = {}
+        self.watchers: Dict[int, Set[int]] = {}
+        self.watching: Dict[int, Set[int]] = {}
+        self.pending_presence: Dict[int, str] = {}
+        self.pubsub: PubSub | event_bus.StreamSubscription | None = None
+        self.channels: Set[str] = set()
+        self.channels_dirty = False
+        self.sync_task: asyncio.Task | None = None
+
+    async def connect(self, user_id: int, websocket: WebSocket, username) -> Connection:
         redis = websocket.app.state.redis
-        self.active[user_id] = websocket
+        previous = self.active.get(user_id)
+        if previous:
+            previous.stop()
+        conn = Connection(self, user_id, websocket)
+        conn.hold()
+        conn.start()
+        self.active[user_id] = conn
+        self.resync_channels()
+        if self.sync_task:
+            await asyncio.shield(self.sync_task)
+        await presence.mark_online(redis, [user_id])
         payload = {"type": "presence", "user_id": user_id, "presence_status": "online", "username": username}
-        await redis.publish(PRESENCE_CHANNEL, json.dumps(payload))
-
-    async def disconnect(self, user_id: int):
-        self.active.pop(user_id, None)
+        await event_bus.publish(redis, PRESENCE_CHANNEL, dumps(payload))
+        return conn
+
+    async def disconnect(self, user_id: int, websocket: WebSocket | None = None):
+        conn = self.active.get(user_id)
+        if conn and (websocket is None or conn.websocket is websocket):
+            self.forget(conn)
+
+    def forget(self, conn: Connection):
+        conn.stop()
+        if self.active.get(conn.user_id) is conn:
+            del self.active[conn.user_id]
+            self.leave_rooms(conn.user_id)
+            self.unwatch(conn.user_id)
+            self.resync_channels()
 
     def is_online(self, user_id: int) -> bool:
         return user_id in self.active
 
-    async def send_json_to(self, user_id: int, payload: dict):
-        ws = self.active.get(user_id)
-        if not ws:
-            return
-        try:
-            await ws.send_json(payload)
-        except Exception:
-            self.active.pop(user_id, None)
+    def join_rooms(self, user_id: int, group_ids: Iterable[int]):
+        for group_id in group_ids:
+            self.rooms.setdefault(group_id, set()).add(user_id)
+            self.user_rooms.setdefault(user_id, set()).add(group_id)
+        self.resync_channels()
+
+    def join_room(self, group_id: int, user_id: int):
+        if self.is_online(user_id):
+            self.join_rooms(user_id, (group_id,))
 
-    async def broadcast_except(self, except_user_id: int, payload: dict):
-        to_remove = []
-        for uid, ws in list(self.active.items()):
-            if uid == except_user_id:
+    def leave_rooms(self, user_id: int):
+        for group_id in self.user_rooms.pop(user_id, ()):
+            members = self.rooms.get(group_id)
+            if members is None:
                 continue
+            members.discard(user_id)
+            if not members:
+                del self.rooms[group_id]
+
+    def room_members(self, group_id: int) -> Set[int]:
+        return self.rooms.get(group_id, set())
+
+    def wanted_channels(self) -> Set[str]:
+        return {user_channel(uid) for uid in self.active} | {f"group:{gid}" for gid in self.rooms}
+
+    def resync_channels(self):
+        self.channels_dirty = True
+        if self.pubsub is not None and (self.sync_task is None or self.sync_task.done()):
+            self.sync_task = asyncio.get_running_loop().create_task(self.sync_channels())
+
+    async def sync_channels(self):
+        while self.channels_dirty and self.pubsub is not None:
+            self.channels_dirty = False
+            wanted = self.wanted_channels()
+            added, removed = wanted - self.channels, self.channels - wanted
             try:
-                await ws.send_json(payload)
+                if added:
+                    await self.pubsub.subscribe(*added)
+                if removed:
+                    await self.pubsub.unsubscribe(*removed)
             except Exception:
-                to_remove.append(uid)
+                logger.error("Updating Redis subscriptions failed", exc_info=True)
+                return
+            self.channels = wanted
+
+    def send_json_to(self, user_id: int, payload: dict, key: Hashable | None = None) -> bool:
+        return self.send_frame_to(user_id, dumps(payload), key)
+
+    def send_frame_to(self, user_id: int, frame: str, key: Hashable | None = None) -> bool:
+        conn = self.active.get(user_id)
+        if not conn:
+            return False
+        return conn.enqueue(frame, key)
+
+    def watch(self, watcher_id: int, user_ids: Iterable[int]):
+        watched = self.watching.setdefault(watcher_id, set())
+        for user_id in user_ids:
+            if user_id == watcher_id or len(watched) >= PRESENCE_MAX_WATCH:
+                continue
+            watched.add(user_id)
+            self.watchers.setdefault(user_id, set()).add(watcher_id)
+
+    def unwatch(self, watcher_id: int, user_ids: Iterable[int] | None = None):
+        watched = self.watching.get(watcher_id, set())
+        for user_id in list(watched if user_ids is None else user_ids):
+            watched.discard(user_id)
+            watchers = self.watchers.get(user_id)
+            if watchers is None:
+                continue
+            watchers.discard(watcher_id)
+            if not watchers:
+                del self.watchers[user_id]
+        if not watched:
+            self.watching.pop(watcher_id, None)
 
-        for uid in to_remove:
-            self.active.pop(uid, None)
+    def watchers_of(self, user_id: int) -> Set[int]:
+        return self.watchers.get(user_id, set())
+
+    def push_presence(self, user_id: int, frame: str):
+        if user_id not in self.watchers:
+            return
+        first = user_id not in self.pending_presence
+        self.pending_presence[user_id] = frame
+        if first:
+            asyncio.get_running_loop().call_later(PRESENCE_COALESCE_MS / 1000, self._flush_presence, user_id)
+
+    def _flush_presence(self, user_id: int):
+        frame = self.pending_presence.pop(user_id, None)
+        if frame is None:
+            return
+        for watcher_id in self.watchers_of(user_id):
+            self.send_frame_to(watcher_id, frame, key=("presence", user_id))
+
+    def stats(self) -> dict:
+        depths = [len(conn.queue) for conn in self.active.values()]
+        return {
+            "connections": len(self.active),
+            "policy": self.policy,
+            "max_queue": self.max_queue,
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "dropped": self.dropped,
+            "slow_disconnects": self.slow_disconnects,
+            "channels": len(self.channels),
+        }
 
 
 manager = ConnectionManager()
@@ -77,76 +307,227 @@ async def fetch_user_from_db(user_id: int):
         await gen.aclose()  # type: ignore
 
 
-async def send_pending_messages(user_id: int):
+async def save_direct_message(
+    author_id: int, recipient_id: int, text: str | None, image_url: str | None, status: str = "pending"
+) -> tuple[int, datetime]:
+    values = {
+        "author_id": author_id,
+        "recipient_id": recipient_id,
+        "message": text,
+        "status": status,
+        "image_url": image_url,
+    }
+    if message_batcher.running:
+        return await message_batcher.submit(**values)
     gen = get_db()
     try:
         db = await gen.__anext__()
-        result = await db.execute(
-            select(Messages).where(Messages.recipient_id == user_id, Messages.status == "pending")
-        )
-        pending = result.scalars().all()
-
-        for msg in pending:
-            author_name = await get_username(msg.author_id, db)  # type: ignore
-            payload = {
-                "type": "message",
-                "message_id": msg.id,
-                "author_id": msg.author_id,
-                "author_name": author_name,
-                "recipient_id": msg.recipient_id,
-                "message": msg.message,
-                "timestamp": msg.timestamp.isoformat(),
-                "status": "delivered",
-                "image_url": msg.image_url or None,
-            }
-            if manager.is_online(user_id):
-                await manager.send_json_to(user_id, payload)
+        msg = Messages(**values)
+        db.add(msg)
+        await db.flush()
+        await conversations.record_direct(db, [{**values, "id": msg.id, "timestamp": msg.timestamp}])
         await db.commit()
+        return msg.id, msg.timestamp  # type: ignore
     finally:
         await gen.aclose()  # type: ignore
 
 
-async def send_unread_group_messages(user_id: int, websocket: WebSocket):
+async def send_pending_messages(user_id: int, conn: Connection, redis=None):
+    messages = Messages.__table__
+    last_id = 0
+    gen = get_db()
+    try:
+        db = await gen.__anext__()
+        while True:
+            result = await db.execute(
+                select(
+                    Messages.id,
+                    Messages.author_id,
+                    User.username,
+                    Messages.message,
+                    Messages.timestamp,
+                    Messages.image_url,
+                )
+                .join(User, User.id == Messages.author_id)
+                .where(Messages.recipient_id == user_id, Messages.status == "pending", Messages.id > last_id)
+                .order_by(Messages.id.asc())
+                .limit(PENDING_PAGE_SIZE)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            batch = [
+                {
+                    "type": "message",
+                    "message_id": message_id,
+                    "author_id": author_id,
+                    "author_name": author_name,
+                    "recipient_id": user_id,
+                    "message": text,
+                    "timestamp": timestamp.isoformat(),
+                    "status": "delivered",
+                    "image_url": image_url or None,
+                }
+                for message_id, author_id, author_name, text, timestamp, image_url in rows
+            ]
+            await conn.send_text(dumps({"type": "message_batch", "messages": batch}))
+            await db.execute(
+                messages.update()  # type: ignore
+                .where(messages.c.id.in_([row.id for row in rows]), messages.c.status == "pending")
+                .values(status="delivered")
+            )
+            await db.commit()
+            await history_cache.mark_delivered(redis, user_id, {row.author_id: row.id for row in rows})
+            last_id = rows[-1].id
+            if len(rows) < PENDING_PAGE_SIZE:
+                break
+    finally:
+        await gen.aclose()  # type: ignore
+
+
+async def send_unread_group_messages(
+    user_id: int, conn: Connection, group_id: int | None = None, after_id: int | None = None, redis=None
+):
+    members = GroupMember.__table__
+    last_read = func.coalesce(GroupMember.last_read_message_id, 0) if after_id is None else after_id
+    conditions = [GroupMember.user_id == user_id, GroupMessage.id > last_read]
+    if group_id is not None:
+        conditions.append(GroupMember.group_id == group_id)
+    position = func.row_number().over(partition_by=GroupMessage.group_id, order_by=GroupMessage.id).label("position")
+    unread_rows = (
+        select(
+            GroupMessage.group_id,
+            GroupMessage.id,
+            GroupMessage.author_id,
+            User.username.label("author_name"),
+            GroupMessage.message,
+            GroupMessage.timestamp,
+            GroupMessage.image_url,
+            func.coalesce(GroupMember.last_read_message_id, 0).label("read_before"),
+            position,
+        )
+        .join(GroupMember, GroupMember.group_id == GroupMessage.group_id)
+        .outerjoin(User, User.id == GroupMessage.author_id)
+        .where(*conditions)
+        .subquery()
+    )
     gen = get_db()
     try:
         db = await gen.__anext__()
         result = await db.execute(
-            select(GroupMember.group_id, GroupMember.last_read_message_id).where(GroupMember.user_id == user_id)
+            select(unread_rows)
+            .where(unread_rows.c.position <= GROUP_CATCHUP_LIMIT + 1)
+            .order_by(unread_rows.c.group_id, unread_rows.c.id)
         )
-        row = result.all()
+        by_group: dict[int, list] = {}
+        for row in result.all():
+            by_group.setdefault(row.group_id, []).append(row)
+        if not by_group:
+            if group_id is not None:
+                await conn.send_text(dumps({"type": "group_catchup", "groups": []}))
+            return
 
-        for grp_id, last_read in row:
-            last_read = last_read or 0
-            result = await db.execute(
-                select(GroupMessage)
-                .where(GroupMessage.group_id == grp_id, GroupMessage.id > last_read)
-                .order_by(GroupMessage.id.asc())
+        groups = []
+        cursors = {}
+        read_counts = {}
+        for grp_id, rows in by_group.items():
+            has_more = len(rows) > GROUP_CATCHUP_LIMIT
+            rows = rows[:GROUP_CATCHUP_LIMIT]
+            cursors[grp_id] = rows[-1].id
+            # A replay from an older after_id must not count messages that were already read.
+            newly_read = sum(1 for row in rows if row.id > row.read_before and row.author_id != user_id)
+            if newly_read:
+                read_counts[grp_id] = newly_read
+            groups.append(
+                {
+                    "group_id": grp_id,
+                    "messages": [
+                        {
+                            "type": "group_message",
+                            "group_id": grp_id,
+                            "message_id": row.id,
+                            "author_id": row.author_id,
+                            "author_name": row.author_name,
+                            "message": row.message,
+                            "timestamp": row.timestamp.isoformat(),
+                            "status": "delivered",
+                            "image_url": row.image_url or None,
+                        }
+                        for row in rows
+                    ],
+                    "has_more": has_more,
+                    "cursor": cursors[grp_id],
+                }
             )
-            unread_msgs = result.scalars().all()
-            if not unread_msgs:
-                continue
-            for msg in unread_msgs:
-                author_name = await get_username(msg.author_id, db)  # type: ignore
-                await websocket.send_json(
-                    {
-                        "type": "group_message",
-                        "group_id": grp_id,
-                        "message_id": msg.id,
-                        "author_id": msg.author_id,
-                        "author_name": author_name,
-                        "message": msg.message,
-                        "timestamp": msg.timestamp.isoformat(),
-                        "status": "delivered",
-                        "image_url": msg.image_url or None,
-                    }
-                )
-            new_last = unread_msgs[-1].id
-            await db.execute(
-                GroupMember.__table__.update()
-                .where(GroupMember.user_id == user_id, GroupMember.group_id == grp_id)
-                .values(last_read_message_id=new_last)
+        await conn.send_text(dumps({"type": "group_catchup", "groups": groups}))
+        cursor = case(cursors, value=members.c.group_id)
+        # Only ever moves the read marker forward.
+        await db.execute(
+            members.update()  # type: ignore
+            .where(
+                members.c.user_id == user_id,
+                members.c.group_id.in_(cursors),
+                func.coalesce(members.c.last_read_message_id, 0) < cursor,
             )
+            .values(last_read_message_id=cursor)
+        )
+        await db.commit()
+        if redis and read_counts:
+            await unread.advance_group_reads(redis, user_id, read_counts)
+    finally:
+        await gen.aclose()  # type: ignore
+
+
+async def go_offline(redis, user_id: int, websocket: WebSocket):
+    await manager.disconnect(user_id, websocket)
+    if manager.is_online(user_id):
+        return
+    try:
+        await resume.touch(redis, [user_id])
+        last_seen_iso = await presence.mark_offline(redis, user_id)
+        if last_seen_iso is None:
+            return
+        gen = get_db()
+        try:
+            db = await gen.__anext__()
+            username = await get_username(user_id, db)
+        finally:
+            await gen.aclose()  # type: ignore
+        payload = {
+            "type": "presence",
+            "user_id": user_id,
+            "username": username,
+            "presence_status": "offline",
+            "last_seen_iso": last_seen_iso,
+        }
+        await event_bus.publish(redis, PRESENCE_CHANNEL, dumps(payload))
+    except Exception:
+        logger.error("Failed to mark user offline", exc_info=True, extra={"user_id": user_id})
+
+
+async def replay_events(user_id: int, conn: Connection, frames: list[str], redis=None):
+    if frames:
+        await conn.send_text('{"type":"resume_batch","events":[' + ",".join(frames) + "]}")
+    message_ids = []
+    latest_by_author: dict[int, int] = {}
+    for frame in frames:
+        event = loads(frame)
+        if event.get("type") == "message" and event.get("recipient_id") == user_id:
+            message_ids.append(event["message_id"])
+            latest_by_author[event["author_id"]] = max(latest_by_author.get(event["author_id"], 0), event["message_id"])
+    if not message_ids:
+        return
+    messages = Messages.__table__
+    gen = get_db()
+    try:
+        db = await gen.__anext__()
+        await db.execute(
+            messages.update()  # type: ignore
+            .where(messages.c.id.in_(message_ids), messages.c.status == "pending")
+            .values(status="delivered")
+        )
         await db.commit()
+        await history_cache.mark_delivered(redis, user_id, latest_by_author)
     finally:
         await gen.aclose()  # type: ignore
 
@@ -155,6 +536,7 @@ async def send_unread_group_messages(user_id: int, websocket: WebSocket):
 async def websocket_chat(websocket: WebSocket):
     redis = websocket.app.state.redis
     token = websocket.headers.get("sec-websocket-protocol")
+    resume_from = websocket.query_params.get("resume_from")
 
     if not token:
         await websocket.accept()
@@ -181,142 +563,167 @@ async def websocket_chat(websocket: WebSocket):
     gen = get_db()
     try:
         db = await gen.__anext__()
-        result = await db.execute(select(User).where(User.id == user_id))
-        user = result.scalar_one_or_none()
-        if user:
-            user.presence_status = "online"  # type: ignore
-            db.add(user)
-            await db.commit()
-            logger.info("User online", extra={"user_id": user.id})
         username = await get_username(user_id, db)
-        await manager.connect(user_id, websocket, username)
+        result = await db.execute(select(GroupMember.group_id).where(GroupMember.user_id == user_id))
+        group_ids = result.scalars().all()
+        result = await db.execute(
+            select(GroupMember.user_id)
+            .where(GroupMember.group_id.in_(group_ids), GroupMember.user_id != user_id)
+            .distinct()
+            .limit(PRESENCE_MAX_WATCH)
+        )
+        co_members = result.scalars().all()
     finally:
         await gen.aclose()  # type: ignore
+    conn = await manager.connect(user_id, websocket, username)
+    manager.join_rooms(user_id, group_ids)  # type: ignore
+    manager.watch(user_id, co_members)  # type: ignore
+    logger.info("User online", extra={"user_id": user_id})
+    reads = ReadCursorCoalescer(user_id, redis)
 
     try:
-        await send_pending_messages(user_id)
-        await send_unread_group_messages(user_id, websocket)
+        seq, fresh = await resume.open_session(redis, user_id)
+        replay = None
+        if resume_from is not None and resume_from.isdigit() and not fresh:
+            replay = await resume.since(redis, user_id, int(resume_from))
+        await conn.send_text(dumps({"type": "resume", "seq": seq, "resumed": replay is not None}))
+        if replay is not None:
+            await replay_events(user_id, conn, replay, redis=redis)
+        # Runs on resume too: REST sends and group messages never go through the resume buffer.
+        await send_pending_messages(user_id, conn, redis=redis)
+        await send_unread_group_messages(user_id, conn, redis=redis)
+        counters = await unread.summary(redis, user_id, list(group_ids))
+        await conn.send_text(dumps({"type": "unread_summary", **counters}))
+        conn.release()
         while True:
             data = await websocket.receive_json()
             if data.get("type") == "message":
                 recipient_id = int(data.get("recipient_id"))
                 if not recipient_id:
-                    await websocket.send_json({"type": "error", "reason": "recipient id not provided"})
+                    await conn.send_json({"type": "error", "reason": "recipient id not provided"})
                     continue
                 text = data.get("message", "").strip()
                 image_url = data.get("image_url", None)
                 if not image_url and not text:
-                    await websocket.send_json({"type": "error", "reason": "empty message"})
+                    await conn.send_json({"type": "error", "reason": "empty message"})
                     continue
 
                 rl_key = f"rl:{user_id}:send_message"
                 allowed = await check_rate_limit(redis=redis, key=rl_key, limit=20, window_seconds=60)
                 if not allowed:
-                    await websocket.send_json({"type": "error", "reason": "rate limit exceeded"})
+                    await conn.send_json({"type": "error", "reason": "rate limit exceeded"})
                     logger.warning("Rate limit exceeded", extra={"user_id": user_id})
                     continue
 
                 gen = get_db()
                 try:
                     db = await gen.__anext__()
-                    msg = Messages(
-                        author_id=user_id,
-                        recipient_id=recipient_id,
-                        message=text,
-                        status="pending",
-                        image_url=image_url,
-                    )
-
-                    db.add(msg)
-                    await db.flush()
-                    message_id = msg.id
-
-                    is_online = manager.is_online(recipient_id)
-                    author_name = await get_username(user_id, db)
-                    recipient_name = await get_username(recipient_id, db)
-                    forward_payload = {
-                        "type": "message",
-                        "message_id": msg.id,
-                        "author_id": user_id,
-                        "author_name": author_name,
-                        "recipient_id": recipient_id,
-                        "recipient_name": recipient_name,
-                        "message": text or None,
-                        "timestamp": msg.timestamp.isoformat(),
-                        "status": "delivered" if is_online else "pending",
-                        "image_url": image_url or None,
-                    }
-                    await websocket.send_json(forward_payload)
-                    await redis.publish(CHAT_CHANNEL, json.dumps(forward_payload))
-                    logger.info("WS message forwarded", extra={"from": user_id, "to": recipient_id})
-                    await db.commit()
+                    names = await get_usernames((user_id, recipient_id), db)
                 finally:
                     await gen.aclose()  # type: ignore
+                if names.get(recipient_id) is None:
+                    await conn.send_json({"type": "error", "reason": "recipient does not exist"})
+                    continue
+
+                is_online = manager.is_online(recipient_id) or await presence.is_online(redis, recipient_id)
+                delivery_status = "delivered" if is_online else "pending"
+                try:
+                    message_id, timestamp = await save_direct_message(
+                        user_id, recipient_id, text, image_url, delivery_status
+                    )
+                except Exception:
+                    logger.error("Failed to save message", exc_info=True, extra={"user_id": user_id})
+                    await conn.send_json({"type": "error", "reason": "message not saved"})
+                    continue
+
+                forward_payload = {
+                    "type": "message",
+                    "message_id": message_id,
+                    "author_id": user_id,
+                    "author_name": names.get(user_id),
+                    "recipient_id": recipient_id,
+                    "recipient_name": names.get(recipient_id),
+                    "message": text or None,
+                    "timestamp": timestamp.isoformat(),
+                    "status": delivery_status,
+                    "image_url": image_url or None,
+                }
+                frame = dumps(forward_payload)
+                await conn.send_text(frame)
+                async with pipelined(redis) as pipe:
+                    queue_mark_write(pipe, user_id)
+                    resume.queue_record_publish(pipe, recipient_id, user_channel(recipient_id), frame)
+                    unread.queue_incr_direct(pipe, recipient_id, user_id)
+                    history_cache.queue_append(
+                        pipe,
+                        history_cache.direct_key(user_id, recipient_id),
+                        history_cache.entry(forward_payload, history_cache.DIRECT_FIELDS),
+                    )
+                logger.info("WS message forwarded", extra={"from": user_id, "to": recipient_id})
 
                 ack = {"type": "ack", "message_id": message_id, "status": forward_payload.get("status", "pending")}
-                await websocket.send_json(ack)
+                await conn.send_json(ack)
 
             elif data.get("type") == "read":
-                mid = int(data.get("message_id"))
-                if not mid:
-                    await websocket.send_json({"type": "error", "reason": "message_id not provided"})
+                peer_id = data.get("peer_id")
+                up_to = int(data.get("up_to") or data.get("message_id") or 0)
+                if not up_to:
+                    await conn.send_json({"type": "error", "reason": "up_to not provided"})
                     continue
-                gen = get_db()
-                try:
-                    db = await gen.__anext__()
-                    result = await db.execute(select(Messages).where(Messages.id == mid))
-                    m = result.scalar_one_or_none()
-                    if m and m.recipient_id == user_id and m.status != "read":  # type: ignore
-                        m.status = "read"  # type: ignore
-                        db.add(m)
-                        await db.commit()
-                        author_id = m.author_id
-                        try:
-                            reader_name = await get_username(user_id, db)  # type: ignore
-                            await redis.publish(
-                                READ_CHANNEL,
-                                json.dumps(
-                                    {
-                                        "type": "read_receipt",
-                                        "message_id": m.id,
-                                        "reader_id": user_id,
-                                        "author_id": author_id,
-                                        "reader_name": reader_name,
-                                    }
-                                ),
-                            )
-                        except Exception:
-                            await manager.disconnect(int(author_id))  # type: ignore
-                finally:
-                    await gen.aclose()  # type: ignore
+                if peer_id is None:
+                    gen = get_db()
+                    try:
+                        db = await gen.__anext__()
+                        result = await db.execute(
+                            select(Messages.author_id).where(Messages.id == up_to, Messages.recipient_id == user_id)
+                        )
+                        peer_id = result.scalar_one_or_none()
+                    finally:
+                        await gen.aclose()  # type: ignore
+                    if peer_id is None:
+                        continue
+                reads.add(int(peer_id), up_to)
 
             elif data.get("type") == "group_message":
                 group_id = int(data.get("group_id"))
                 text = data.get("message")
                 image_url = data.get("image_url")
                 if not group_id:
-                    await websocket.send_json({"type": "error", "reason": "group id not found"})
+                    await conn.send_json({"type": "error", "reason": "group id not found"})
                     continue
                 if not text and not image_url:
-                    await websocket.send_json({"type": "error", "reason": "empty message"})
+                    await conn.send_json({"type": "error", "reason": "empty message"})
                     continue
                 author_id = user_id
                 allowed = await check_rate_limit(redis, f"rl:{user_id}:group_message", limit=30, window_seconds=60)
                 if not allowed:
-                    await websocket.send_json({"type": "error", "reason": "rate limit exceeded"})
+                    await conn.send_json({"type": "error", "reason": "rate limit exceeded"})
                     continue
                 gen = get_db()
                 try:
                     db = await gen.__anext__()
                     result = await db.execute(
-                        select(GroupMember).where(GroupMember.user_id == author_id, GroupMember.group_id == group_id)
+                        select(GroupMember.user_id).where(
+                            GroupMember.group_id == group_id, GroupMember.user_id == author_id
+                        )
                     )
-                    member = result.scalar_one_or_none()
-                    if not member:
-                        await websocket.send_json({"type": "error", "reason": "user is not a member of the group"})
+                    if result.scalar_one_or_none() is None:
+                        await conn.send_json({"type": "error", "reason": "user is not a member of the group"})
                         continue
                     group_msg = GroupMessage(group_id=group_id, author_id=author_id, message=text, image_url=image_url)
                     db.add(group_msg)
+                    await db.flush()
+                    await conversations.record_group(
+                        db,
+                        group_id,
+                        {
+                            "id": group_msg.id,
+                            "author_id": author_id,
+                            "message": text,
+                            "image_url": image_url,
+                            "timestamp": group_msg.timestamp,
+                        },
+                    )
                     await db.commit()
                     await db.refresh(group_msg)
                     group_msg_id = group_msg.id
@@ -335,20 +742,30 @@ async def websocket_chat(websocket: WebSocket):
                         "status": "pending",
                         "image_url": image_url or None,
                     }
-                    await websocket.send_json(payload)
-                    await redis.publish(f"group:{group_id}", json.dumps(payload))
+                    frame = dumps(payload)
+                    await conn.send_text(frame)
+                    # Not buffered per member: message_id orders the group, and clients resume it with group_catchup.
+                    async with pipelined(redis) as pipe:
+                        queue_mark_write(pipe, user_id)
+                        event_bus.queue_publish(pipe, f"group:{group_id}", frame)
+                        unread.queue_incr_group(pipe, group_id, author_id)
+                        history_cache.queue_append(
+                            pipe,
+                            history_cache.group_key(group_id),
+                            history_cache.entry(payload, history_cache.GROUP_FIELDS),
+                        )
                     logger.info("Group message forwarded", extra={"user_id": user_id, "group_id": group_id})
 
-                    await websocket.send_json({"type": "ack", "message_id": group_msg.id, "status": "pending"})
+                    await conn.send_json({"type": "ack", "message_id": group_msg.id, "status": "pending"})
                 except Exception:
-                    await manager.disconnect(author_id)
+                    await manager.disconnect(author_id, websocket)
                 finally:
                     await gen.aclose()  # type: ignore
 
             elif data.get("type") == "group_read":
                 group_id = int(data.get("group_id"))
                 if not group_id:
-                    await websocket.send_json({"type": "error", "reason": "group_id not provided"})
+                    await conn.send_json({"type": "error", "reason": "group_id not provided"})
                     continue
                 last_id = int(data.get("message_id") or 0)
 
@@ -362,7 +779,7 @@ async def websocket_chat(websocket: WebSocket):
                     )
                     author = result.scalar_one_or_none()
                     if author == user_id:
-                        await websocket.send_json(
+                        await conn.send_json(
                             {"type": "error", "reason": "Authors cannot mark their own messages as read."}
                         )
                         continue
@@ -371,51 +788,61 @@ async def websocket_chat(websocket: WebSocket):
                         .where((GroupMember.group_id == group_id) & (GroupMember.user_id == user_id))
                         .values(last_read_message_id=last_id)
                     )
+                    result = await db.execute(
+                        select(func.count(GroupMessage.id)).where(
+                            GroupMessage.group_id == group_id,
+                            GroupMessage.id > last_id,
+                            GroupMessage.author_id != user_id,
+                        )
+                    )
+                    left = result.scalar_one()
                     await db.commit()
+                    await unread.set_group_unread(redis, user_id, group_id, left)
                     payload = {"type": "group_read", "group_id": group_id, "user_id": user_id, "message_id": last_id}
-                    await redis.publish(f"group:{group_id}", json.dumps(payload))
+                    await event_bus.publish(redis, f"group:{group_id}", dumps(payload))
                 finally:
                     await gen.aclose()  # type: ignore
 
-            else:
-                await websocket.send_json({"type": "error", "reason": "unknown_type"})
+            elif data.get("type") == "group_catchup":
+                group_id = int(data.get("group_id") or 0)
+                if not group_id:
+                    await conn.send_json({"type": "error", "reason": "group_id not provided"})
+                    continue
+                after_id = data.get("after_id")
+                await send_unread_group_messages(
+                    user_id,
+                    conn,
+                    group_id=group_id,
+                    after_id=int(after_id) if after_id is not None else None,
+                    redis=redis,
+                )
+
+            elif data.get("type") == "presence_subscribe":
+                user_ids = [int(uid) for uid in data.get("user_ids") or []][:PRESENCE_MAX_WATCH]
+                manager.watch(user_id, user_ids)
+                gen = get_db()
+                try:
+                    db = await gen.__anext__()
+                    snapshot = await presence.snapshot(redis, db, user_ids)
+                finally:
+                    await gen.aclose()  # type: ignore
+                await conn.send_json({"type": "presence_snapshot", "users": snapshot})
+
+            elif data.get("type") == "presence_unsubscribe":
+                manager.unwatch(user_id, [int(uid) for uid in data.get("user_ids") or []])
 
-    except WebSocketDisconnect:
-        gen = get_db()
-        try:
-            db = await gen.__anext__()
-            result = await db.execute(select(User).where(User.id == user_id))
-            user = result.scalar_one_or_none()
-            if user:
-                user.presence_status = "offline"  # type: ignore
-                user.last_seen = datetime.now(timezone.utc)  # type: ignore
-                db.add(user)
-                await db.commit()
-                last_seen_iso = user.last_seen.isoformat()
             else:
-                last_seen_iso = None
-        finally:
-            await gen.aclose()  # type: ignore
+                await conn.send_json({"type": "error", "reason": "unknown_type"})
 
-        username = await get_username(user_id, db)
-        await redis.publish(
-            PRESENCE_CHANNEL,
-            json.dumps(
-                {
-                    "type": "presence",
-                    "user_id": user_id,
-                    "username": username,
-                    "presence_status": "offline",
-                    "last_seen_iso": last_seen_iso,
-                }
-            ),
-        )
+    except WebSocketDisconnect:
         logger.info("User disconnected", extra={"user_id": user_id})
-        await manager.disconnect(user_id)
+        await reads.close()
+        await go_offline(redis, user_id, websocket)
 
     except Exception:
         logger.error("Websocket error", exc_info=True)
-        await manager.disconnect(user_id)
+        await reads.close()
+        await go_offline(redis, user_id, websocket)
         try:
             await websocket.close()
         except Exception:
@@ -0,0 +1,112 @@
+import re
+
+from sqlalchemy import DDL, DateTime, event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import GroupMessage, GroupMessageArchive, MessageArchive, Messages
+
+SEARCH_CONFIG = "english"
+SNIPPET_START, SNIPPET_STOP = "<mark>", "</mark>"
+SNIPPET_WORDS = 12
+
+DIRECT_TABLES = (Messages.__tablename__, MessageArchive.__tablename__)
+GROUP_TABLES = (GroupMessage.__tablename__, GroupMessageArchive.__tablename__)
+
+DIRECT_PEER = "CASE WHEN m.author_id = :me THEN m.recipient_id ELSE m.author_id END"
+DIRECT_SCOPE = "(m.author_id = :me OR m.recipient_id = :me)"
+GROUP_SCOPE = "m.group_id IN (SELECT group_id FROM group_members WHERE user_id = :me)"
+
+
+def postgres_ddl(table: str) -> list[str]:
+    # Generated, so every insert path (ORM, batcher, archive job) keeps the vector current.
+    return [
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS "
+        f"(to_tsvector('{SEARCH_CONFIG}', coalesce(message, ''))) STORED",
+        f"CREATE INDEX IF NOT EXISTS ix_{table}_search ON {table} USING gin (search_vector)",
+    ]
+
+
+def sqlite_ddl(table: str) -> list[str]:
+    fts = f"{table}_fts"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"message, content='{table}', content_rowid='id', tokenize='porter unicode61')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, message) VALUES (new.id, new.message); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, message) VALUES ('delete', old.id, old.message); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF message ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, message) VALUES ('delete', old.id, old.message); "
+        f"INSERT INTO {fts}(rowid, message) VALUES (new.id, new.message); END",
+    ]
+
+
+def register_ddl():
+    for model in (Messages, MessageArchive, GroupMessage, GroupMessageArchive):
+        table = model.__table__
+        for statement in postgres_ddl(table.name):
+            event.listen(table, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+        for statement in sqlite_ddl(table.name):
+            event.listen(table, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+        # The FTS table is not part of the metadata, so it has to go with its content table.
+        event.listen(table, "before_drop", DDL(f"DROP TABLE IF EXISTS {table.name}_fts").execute_if(dialect="sqlite"))
+
+
+register_ddl()
+
+
+def fts_query(query: str) -> str:
+    # Quoted terms are matched literally, so user input cannot break the FTS5 query syntax.
+    return " ".join(f'"{term}"' for term in re.findall(r"\w+", query))
+
+
+def postgres_branch(kind: str, table: str) -> str:
+    peer, scope = (DIRECT_PEER, DIRECT_SCOPE) if kind == "direct" else ("m.group_id", GROUP_SCOPE)
+    return (
+        f"SELECT '{kind}' AS kind, m.id, m.author_id, {peer} AS peer_id, m.message, m.\"timestamp\", "
+        f"ts_rank(m.search_vector, q) AS rank "
+        f"FROM {table} m, websearch_to_tsquery('{SEARCH_CONFIG}', :q) q "
+        f"WHERE m.search_vector @@ q AND {scope}"
+    )
+
+
+def sqlite_branch(kind: str, table: str) -> str:
+    peer, scope = (DIRECT_PEER, DIRECT_SCOPE) if kind == "direct" else ("m.group_id", GROUP_SCOPE)
+    fts = f"{table}_fts"
+    # bm25 is lower for better matches; negated so both dialects sort rank descending.
+    return (
+        f"SELECT '{kind}' AS kind, m.id, m.author_id, {peer} AS peer_id, m.message, m.\"timestamp\", "
+        f"-bm25({fts}) AS rank, "
+        f"snippet({fts}, 0, '{SNIPPET_START}', '{SNIPPET_STOP}', '…', {SNIPPET_WORDS}) AS snippet "
+        f"FROM {fts} JOIN {table} m ON m.id = {fts}.rowid "
+        f"WHERE {fts} MATCH :q AND {scope}"
+    )
+
+
+def _branches(build) -> str:
+    tables = [("direct", t) for t in DIRECT_TABLES] + [("group", t) for t in GROUP_TABLES]
+    return " UNION ALL ".join(build(kind, table) for kind, table in tables)
+
+
+ORDER = 'ORDER BY rank DESC, "timestamp" DESC, id DESC'
+
+
+async def search(db: AsyncSession, user_id: int, query: str, limit: int, offset: int) -> list:
+    if db.get_bind().dialect.name == "postgresql":
+        # Headlines are the costly part, so they are only built for the page being returned.
+        statement = text(
+            f"SELECT hits.*, ts_headline('{SEARCH_CONFIG}', coalesce(hits.message, ''), "
+            f"websearch_to_tsquery('{SEARCH_CONFIG}', :q), :options) AS snippet "
+            f"FROM ({_branches(postgres_branch)} {ORDER} LIMIT :limit OFFSET :offset) hits {ORDER}"
+        )
+        options = f"StartSel={SNIPPET_START}, StopSel={SNIPPET_STOP}, MaxWords={SNIPPET_WORDS}, MinWords=3"
+        params = {"q": query, "options": options}
+    else:
+        query = fts_query(query)
+        if not query:
+            return []
+        statement = text(f"SELECT * FROM ({_branches(sqlite_branch)}) {ORDER} LIMIT :limit OFFSET :offset")
+        params = {"q": query}
+    typed = statement.columns(timestamp=DateTime(timezone=True))
+    result = await db.execute(typed, {**params, "me": user_id, "limit": limit, "offset": offset})
+    return list(result.mappings().all())
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+
+import redis.asyncio as aioredis
+from sqlalchemy import and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.models import GroupMember, GroupMessage, Messages, User
+from app.redis_client import db as redis_db
+from app.redis_client import host, port
+from app.utils.batching import batches
+
+logger = logging.getLogger(__name__)
+
+GROUP_TOTALS_KEY = "unread:group_totals"
+
+# Counts the author's own message as read; unread messages from others stay unread.
+# KEYS: group totals hash, author's group read hash  ARGV: group id
+GROUP_SENT_SCRIPT = """
+local total = redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+redis.call('HINCRBY', KEYS[2], ARGV[1], 1)
+return total
+"""
+
+# KEYS: user's unread hash  ARGV: field, amount
+DECREMENT_SCRIPT = """
+local left = redis.call('HINCRBY', KEYS[1], ARGV[1], -tonumber(ARGV[2]))
+if left <= 0 then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    return 0
+end
+return left
+"""
+
+# KEYS: group totals hash, user's group read hash  ARGV: group id, unread count left
+SET_GROUP_UNREAD_SCRIPT = """
+local total = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+local read = total - tonumber(ARGV[2])
+if read < 0 then
+    read = 0
+end
+redis.call('HSET', KEYS[2], ARGV[1], read)
+return total - read
+"""
+
+# KEYS: group totals hash, user's group read hash  ARGV: group id, messages read
+ADVANCE_GROUP_READ_SCRIPT = """
+local total = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+local read = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0') + tonumber(ARGV[2])
+if read > total then
+    read = total
+end
+redis.call('HSET', KEYS[2], ARGV[1], read)
+return total - read
+"""
+
+
+def direct_key(user_id: int) -> str:
+    return f"unread:dm:{user_id}"
+
+
+def group_read_key(user_id: int) -> str:
+    return f"unread:group_read:{user_id}"
+
+
+def _int_map(raw: dict) -> dict[int, int]:
+    return {int(k): int(v) for k, v in raw.items()}
+
+
+def queue_incr_direct(pipe, recipient_id: int, author_id: int):
+    pipe.hincrby(direct_key(recipient_id), str(author_id), 1)
+
+
+def queue_decr_direct(pipe, reader_id: int, author_id: int, amount: int = 1):
+    if amount > 0:
+        pipe.eval(DECREMENT_SCRIPT, 1, direct_key(reader_id), str(author_id), amount)
+
+
+def queue_incr_group(pipe, group_id: int, author_id: int):
+    pipe.eval(GROUP_SENT_SCRIPT, 2, GROUP_TOTALS_KEY, group_read_key(author_id), str(group_id))
+
+
+async def set_group_unread(redis, user_id: int, group_id: int, unread: int):
+    await redis.eval(SET_GROUP_UNREAD_SCRIPT, 2, GROUP_TOTALS_KEY, group_read_key(user_id), str(group_id), unread)
+
+
+async def advance_group_reads(redis, user_id: int, read_counts: dict[int, int]):
+    pipe = redis.pipeline(transaction=False)
+    for group_id, count in read_counts.items():
+        pipe.eval(ADVANCE_GROUP_READ_SCRIPT, 2, GROUP_TOTALS_KEY, group_read_key(user_id), str(group_id), count)
+    await pipe.execute()
+
+
+async def summary(redis, user_id: int, group_ids: list[int]) -> dict:
+    pipe = redis.pipeline(transaction=False)
+    pipe.hgetall(direct_key(user_id))
+    if group_ids:
+        pipe.hmget(GROUP_TOTALS_KEY, [str(gid) for gid in group_ids])
+        pipe.hmget(group_read_key(user_id), [str(gid) for gid in group_ids])
+    results = await pipe.execute()
+    groups = {}
+    if group_ids:
+        for gid, total, read in zip(group_ids, results[1], results[2]):
+            groups[gid] = max(int(total or 0) - int(read or 0), 0)
+    return {"direct": _int_map(results[0]), "groups": groups}
+
+
+async def counts_from_db(db: AsyncSession, user_ids: list[int]) -> dict[int, dict]:
+    counts: dict[int, dict] = {uid: {"direct": {}, "groups": {}} for uid in user_ids}
+    result = await db.execute(
+        select(Messages.recipient_id, Messages.author_id, func.count())
+        .where(Messages.recipient_id.in_(user_ids), Messages.status != "read")
+        .group_by(Messages.recipient_id, Messages.author_id)
+    )
+    for recipient_id, author_id, count in result.all():
+        counts[recipient_id]["direct"][author_id] = count
+    result = await db.execute(
+        select(GroupMember.user_id, GroupMember.group_id, func.count(GroupMessage.id))
+        .outerjoin(
+            GroupMessage,
+            and_(
+                GroupMessage.group_id == GroupMember.group_id,
+                GroupMessage.id > func.coalesce(GroupMember.last_read_message_id, 0),
+                GroupMessage.author_id != GroupMember.user_id,
+            ),
+        )
+        .where(GroupMember.user_id.in_(user_ids))
+        .group_by(GroupMember.user_id, GroupMember.group_id)
+    )
+    for uid, gid, count in result.all():
+        counts[uid]["groups"][gid] = count
+    return counts
+
+
+async def rebuild(redis, db: AsyncSession, user_ids: list[int] | None = None) -> int:
+    result = await db.execute(select(GroupMessage.group_id, func.count()).group_by(GroupMessage.group_id))
+    totals = {gid: count for gid, count in result.all()}
+    if totals:
+        await redis.hset(GROUP_TOTALS_KEY, mapping={str(gid): count for gid, count in totals.items()})
+    if user_ids is None:
+        result = await db.execute(select(User.id).order_by(User.id))
+        user_ids = list(result.scalars().all())
+
+    for batch in batches(user_ids):
+        counts = await counts_from_db(db, batch)
+        pipe = redis.pipeline(transaction=False)
+        for uid, unread in counts.items():
+            pipe.delete(direct_key(uid), group_read_key(uid))
+            if unread["direct"]:
+                pipe.hset(direct_key(uid), mapping={str(k): v for k, v in unread["direct"].items()})
+            if unread["groups"]:
+                read = {str(gid): max(totals.get(gid, 0) - count, 0) for gid, count in unread["groups"].items()}
+                pipe.hset(group_read_key(uid), mapping=read)
+        await pipe.execute()
+    logger.info("Unread counters rebuilt", extra={"users": len(user_ids)})
+    return len(user_ids)
+
+
+async def main():
+    redis = aioredis.Redis(host=host, port=port, db=redis_db)
+    try:
+        async with AsyncSessionLocal() as db:
+            await rebuild(redis, db)
+    finally:
+        await redis.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
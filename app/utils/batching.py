@@ -0,0 +1,10 @@
+from typing import Iterable
+
+# Users handled per round when a read model is rebuilt from the message tables.
+REBUILD_BATCH = 500
+
+
+def batches(items: list[int], size: int = REBUILD_BATCH) -> Iterable[list[int]]:
+    for start in range(0, len(items), size):
+        end = start + size
+        yield items[start:end]
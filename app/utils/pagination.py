@@ -0,0 +1,48 @@
+import base64
+import binascii
+import os
+
+from fastapi import HTTPException
+
+from app.utils.serialization import dumps, loads
+
+PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 50))
+MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", 200))
+
+
+def encode_token(data: dict) -> str:
+    return base64.urlsafe_b64encode(dumps(data).encode()).decode().rstrip("=")
+
+
+def decode_token(cursor: str) -> dict:
+    try:
+        data = loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return data
+
+
+def encode_cursor(direction: str, message_id: int) -> str:
+    return encode_token({"d": direction, "id": message_id})
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    data = decode_token(cursor)
+    try:
+        direction, message_id = data["d"], int(data["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if direction not in ("before", "after"):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return direction, message_id
+
+
+def resolve_page(cursor: str | None, before_id: int | None, after_id: int | None) -> tuple[int | None, int | None]:
+    if cursor:
+        direction, message_id = decode_cursor(cursor)
+        return (message_id, None) if direction == "before" else (None, message_id)
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status_code=400, detail="Use either before_id or after_id")
+    return before_id, after_id
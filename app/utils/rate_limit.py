@@ -1,7 +1,134 @@
-async def check_rate_limit(redis, key: str, limit: int, window_seconds: int) -> bool:
-    count = await redis.incr(key)
+import os
+import time
+import uuid
 
-    if count == 1:
-        await redis.expire(key, window_seconds)
+RATE_LIMIT_ALGORITHM = os.getenv("RATE_LIMIT_ALGORITHM", "sliding_window")
+RATE_LIMIT_LOCAL_CHECK = os.getenv("RATE_LIMIT_LOCAL_CHECK", "1") == "1"
+LOCAL_BLOCK_MAX_KEYS = 10000
 
-    return count <= limit
+# Every script returns {allowed, retry_after_ms}.
+SCRIPTS = {
+    # KEYS: counter  ARGV: limit, window_ms
+    "fixed_window": """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+if count > tonumber(ARGV[1]) then
+    return {0, redis.call('PTTL', KEYS[1])}
+end
+return {1, 0}
+""",
+    # KEYS: log zset  ARGV: limit, window_ms, now_ms, member
+    "sliding_log": """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+if redis.call('ZCARD', KEYS[1]) >= limit then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    return {0, tonumber(oldest[2]) + window - now}
+end
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+redis.call('PEXPIRE', KEYS[1], window)
+return {1, 0}
+""",
+    # KEYS: current window counter, previous window counter  ARGV: limit, window_ms, ms into current window
+    "sliding_window": """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local elapsed = tonumber(ARGV[3])
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+if previous * (window - elapsed) / window + current + 1 > limit then
+    -- Time until the weighted estimate admits one more, not the end of the window.
+    local retry
+    if current + 1 <= limit then
+        retry = math.ceil(window - (limit - current - 1) * window / previous) - elapsed
+    else
+        retry = window - elapsed + math.max(0, math.ceil(window - (limit - 1) * window / current))
+    end
+    return {0, math.max(1, retry)}
+end
+redis.call('INCR', KEYS[1])
+redis.call('PEXPIRE', KEYS[1], window * 2)
+return {1, 0}
+""",
+    # KEYS: bucket hash  ARGV: capacity, window_ms, now_ms
+    "token_bucket": """
+local capacity = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local rate = capacity / window
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1] or ARGV[1])
+local ts = tonumber(bucket[2] or ARGV[3])
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+if tokens < 1 then
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', KEYS[1], window)
+    return {0, math.ceil((1 - tokens) / rate)}
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens - 1, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], window)
+return {1, 0}
+""",
+}
+
+_scripts: dict = {}
+_blocked_until: dict[str, float] = {}
+
+
+def _script(redis, algorithm: str):
+    script = _scripts.get(algorithm)
+    if script is None:
+        script = _scripts[algorithm] = redis.register_script(SCRIPTS[algorithm])
+    return script
+
+
+def _locally_blocked(key: str) -> bool:
+    until = _blocked_until.get(key)
+    if until is None:
+        return False
+    if until > time.monotonic():
+        return True
+    del _blocked_until[key]
+    return False
+
+
+def _block_locally(key: str, retry_after_ms: int):
+    if len(_blocked_until) >= LOCAL_BLOCK_MAX_KEYS:
+        now = time.monotonic()
+        for k in [k for k, until in _blocked_until.items() if until <= now]:
+            del _blocked_until[k]
+        if len(_blocked_until) >= LOCAL_BLOCK_MAX_KEYS:
+            return
+    _blocked_until[key] = time.monotonic() + retry_after_ms / 1000
+
+
+async def check_rate_limit(
+    redis, key: str, limit: int, window_seconds: int, algorithm: str = RATE_LIMIT_ALGORITHM
+) -> bool:
+    if RATE_LIMIT_LOCAL_CHECK and _locally_blocked(key):
+        return False
+
+    window_ms = window_seconds * 1000
+    keys: list[str]
+    args: list[int | str]
+    now_ms = int(time.time() * 1000)
+    if algorithm == "fixed_window":
+        keys, args = [key], [limit, window_ms]
+    elif algorithm == "sliding_log":
+        keys, args = [key], [limit, window_ms, now_ms, f"{now_ms}:{uuid.uuid4().hex}"]
+    elif algorithm == "sliding_window":
+        current = now_ms // window_ms
+        keys, args = [f"{key}:{current}", f"{key}:{current - 1}"], [limit, window_ms, now_ms % window_ms]
+    elif algorithm == "token_bucket":
+        keys, args = [key], [limit, window_ms, now_ms]
+    else:
+        raise ValueError(f"Unknown rate limit algorithm: {algorithm}")
+
+    allowed, retry_after_ms = await _script(redis, algorithm)(keys=keys, args=args, client=redis)
+    if not allowed and RATE_LIMIT_LOCAL_CHECK and retry_after_ms > 0:
+        _block_locally(key, retry_after_ms)
+    return bool(allowed)
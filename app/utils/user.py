@@ -1,9 +1,58 @@
+import os
+from typing import Any, Iterable
+
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app import event_bus
 from app.models import User
+from app.utils.cache import TTLCache
+from app.utils.serialization import dumps
+
+USER_CHANNEL = "user_updates"
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 300))
+
+user_cache: TTLCache[int, dict[str, Any]] = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+
+async def get_user_identities(user_ids: Iterable[int], db: AsyncSession) -> dict[int, dict[str, Any]]:
+    found: dict[int, dict[str, Any]] = {}
+    missing = []
+    for user_id in set(user_ids):
+        identity = user_cache.get(user_id)
+        if identity is None:
+            missing.append(user_id)
+        else:
+            found[user_id] = identity
+    if missing:
+        result = await db.execute(select(User.id, User.username).where(User.id.in_(missing)))
+        for user_id, username in result.all():
+            identity = {"username": username}
+            user_cache.set(user_id, identity)
+            found[user_id] = identity
+    return found
+
+
+async def get_usernames(user_ids: Iterable[int], db: AsyncSession) -> dict[int, str | None]:
+    user_ids = list(user_ids)
+    identities = await get_user_identities(user_ids, db)
+    return {user_id: identities.get(user_id, {}).get("username") for user_id in user_ids}
 
 
 async def get_username(user_id: int, db: AsyncSession) -> str | None:
-    result = await db.execute(select(User.username).where(User.id == user_id))
-    return result.scalar_one_or_none()
+    identities = await get_user_identities([user_id], db)
+    return identities.get(user_id, {}).get("username")
+
+
+def invalidate_user(user_id: int):
+    user_cache.pop(user_id)
+
+
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+async def publish_user_invalidation(redis, user_id: int):
+    invalidate_user(user_id)
+    await event_bus.publish(redis, USER_CHANNEL, dumps({"type": "user_invalidate", "user_id": user_id}))
@@ -0,0 +1,39 @@
+import argparse
+import asyncio
+import time
+
+from app.dispatcher import Dispatcher
+
+
+async def run(workers: int, events: int, keys: int, handler_ms: float) -> float:
+    async def handler(key: str, i: int):
+        # Stands in for a socket send or lookup that yields to the loop.
+        await asyncio.sleep(handler_ms / 1000)
+
+    dispatcher = Dispatcher(handler, workers=workers, queue_size=1000)
+    dispatcher.start()
+    start = time.perf_counter()
+    for i in range(events):
+        key = f"user:{i % keys}"
+        await dispatcher.submit(key, key, i)
+    await dispatcher.join()
+    elapsed = time.perf_counter() - start
+    await dispatcher.stop()
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Events per second through the subscriber dispatcher")
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--keys", type=int, default=200)
+    parser.add_argument("--handler-ms", type=float, default=1)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    for workers in args.workers:
+        elapsed = await run(workers, args.events, args.keys, args.handler_ms)
+        print(f"{workers:>3} workers: {args.events} events in {elapsed:.2f}s ({args.events / elapsed:,.0f} events/s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
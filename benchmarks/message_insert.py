@@ -0,0 +1,73 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+# isort: off
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{DB_PATH}")  # noqa: E402
+# isort: on
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.database import Base  # noqa: E402
+from app.message_batcher import MessageBatcher  # noqa: E402
+from app.models import Messages  # noqa: E402
+
+
+def make_row(sender: int, i: int) -> dict:
+    return {"author_id": sender, "recipient_id": sender + 1, "message": f"hello {i}", "status": "pending"}
+
+
+async def per_message_commit(session_factory, senders: int, per_sender: int):
+    async def sender(s: int):
+        for i in range(per_sender):
+            async with session_factory() as db:
+                msg = Messages(**make_row(s, i))
+                db.add(msg)
+                await db.commit()
+
+    await asyncio.gather(*(sender(s) for s in range(senders)))
+
+
+async def batched(session_factory, senders: int, per_sender: int, batch_size: int, interval_ms: float):
+    batcher = MessageBatcher(max_batch=batch_size, interval_ms=interval_ms, session_factory=session_factory)
+    batcher.start()
+
+    async def sender(s: int):
+        for i in range(per_sender):
+            await batcher.submit(**make_row(s, i))
+
+    await asyncio.gather(*(sender(s) for s in range(senders)))
+    await batcher.stop()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare per-message commits with the write-behind batcher")
+    parser.add_argument("--senders", type=int, default=50)
+    parser.add_argument("--per-sender", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--interval-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    engine = create_async_engine(os.environ["DATABASE_URL"])
+    session_factory = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    total = args.senders * args.per_sender
+    for name, run in (
+        ("per-message commit", per_message_commit(session_factory, args.senders, args.per_sender)),
+        ("batched", batched(session_factory, args.senders, args.per_sender, args.batch_size, args.interval_ms)),
+    ):
+        start = time.perf_counter()
+        await run
+        elapsed = time.perf_counter() - start
+        print(f"{name:>20}: {total} messages in {elapsed:.2f}s ({total / elapsed:,.0f} msg/s)")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
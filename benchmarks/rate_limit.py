@@ -0,0 +1,66 @@
+import argparse
+import asyncio
+import time
+
+import redis.asyncio as aioredis
+
+from app.redis_client import db as redis_db
+from app.redis_client import host, port
+from app.utils import rate_limit
+
+
+async def incr_then_expire(redis, key: str, limit: int, window_seconds: int) -> bool:
+    count = await redis.incr(key)
+    if count == 1:
+        await redis.expire(key, window_seconds)
+    return count <= limit
+
+
+def scripted(algorithm: str):
+    async def check(redis, key: str, limit: int, window_seconds: int) -> bool:
+        return await rate_limit.check_rate_limit(redis, key, limit, window_seconds, algorithm=algorithm)
+
+    return check
+
+
+async def run(redis, check, senders: int, per_sender: int, limit: int) -> tuple[float, int]:
+    allowed = 0
+
+    async def sender(s: int):
+        nonlocal allowed
+        for _ in range(per_sender):
+            if await check(redis, f"bench:rl:{s}", limit, 60):
+                allowed += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(sender(s) for s in range(senders)))
+    return time.perf_counter() - start, allowed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare the INCR+EXPIRE limiter with the scripted algorithms")
+    parser.add_argument("--senders", type=int, default=50)
+    parser.add_argument("--per-sender", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--no-local-check", action="store_true")
+    args = parser.parse_args()
+    rate_limit.RATE_LIMIT_LOCAL_CHECK = not args.no_local_check
+
+    redis = aioredis.Redis(host=host, port=port, db=redis_db)
+    total = args.senders * args.per_sender
+    candidates = [("incr+expire", incr_then_expire)]
+    candidates += [(name, scripted(name)) for name in rate_limit.SCRIPTS]
+    try:
+        for name, check in candidates:
+            keys = await redis.keys("bench:rl:*")
+            if keys:
+                await redis.delete(*keys)
+            rate_limit._blocked_until.clear()
+            elapsed, allowed = await run(redis, check, args.senders, args.per_sender, args.limit)
+            print(f"{name:>15}: {total} checks in {elapsed:.2f}s ({total / elapsed:,.0f} checks/s, {allowed} allowed)")
+    finally:
+        await redis.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,5 +1,7 @@
+import json
 import os
 
+import pytest
 import pytest_asyncio
 from httpx import ASGITransport, AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
@@ -42,3 +44,34 @@ async def async_client():
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
         yield ac
+
+
+@pytest.fixture
+def signup_and_login(async_client):
+    async def signup_and_login(username):
+        await async_client.post(
+            "/auth/signup", json={"username": username, "email": f"{username}@example.com", "password": "pw"}
+        )
+        res = await async_client.post("/auth/login", data={"username": username, "password": "pw"})
+        headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+        me = await async_client.get("/users/me", headers=headers)
+        return me.json()["id"], headers
+
+    return signup_and_login
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_text(self, frame):
+        self.frames.append(json.loads(frame))
+
+    async def send_json(self, payload):
+        self.frames.append(payload)
+
+
+@pytest.fixture
+def recording_socket():
+    # A factory: some tests need a fresh socket per call.
+    return RecordingSocket
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app import archive
+from app.database import AsyncSessionLocal
+from app.models import GroupMessage, GroupMessageArchive, MessageArchive, Messages
+
+
+@pytest.mark.asyncio
+async def test_archive_moves_old_messages_and_history_reads_through(async_client, signup_and_login):
+    alice_id, alice = await signup_and_login("archive_alice")
+    bob_id, _ = await signup_and_login("archive_bob")
+    res = await async_client.post("/groups/create-group", params={"name": "archive_group"}, headers=alice)
+    group_id = res.json()["group_id"]
+
+    old = datetime.now(timezone.utc) - timedelta(days=archive.ARCHIVE_AFTER_DAYS + 30)
+    async with AsyncSessionLocal() as db:
+        db.add_all(
+            Messages(author_id=alice_id, recipient_id=bob_id, message=f"old{i}", timestamp=old, status="read")
+            for i in range(3)
+        )
+        db.add(Messages(author_id=alice_id, recipient_id=bob_id, message="old pending", timestamp=old))
+        db.add_all(
+            GroupMessage(group_id=group_id, author_id=alice_id, message=f"gold{i}", timestamp=old) for i in range(3)
+        )
+        await db.flush()
+        db.add_all(Messages(author_id=bob_id, recipient_id=alice_id, message=f"new{i}") for i in range(2))
+        db.add(GroupMessage(group_id=group_id, author_id=alice_id, message="gnew"))
+        await db.commit()
+
+        moved = await archive.archive_all(db, archive.horizon(), batch_size=2)
+        assert moved == {"messages": 3, "group_messages": 3}
+        result = await db.execute(select(Messages.message).where(Messages.author_id == alice_id))
+        assert list(result.scalars().all()) == ["old pending"]
+        result = await db.execute(select(MessageArchive.message).where(MessageArchive.author_id == alice_id))
+        assert sorted(result.scalars().all()) == ["old0", "old1", "old2"]
+        result = await db.execute(select(GroupMessageArchive.id).where(GroupMessageArchive.group_id == group_id))
+        assert len(result.scalars().all()) == 3
+        assert await archive.archive_all(db, archive.horizon()) == {"messages": 0, "group_messages": 0}
+
+    res = await async_client.get(f"/messages/{bob_id}", params={"limit": 4}, headers=alice)
+    page = res.json()
+    assert [m["message"] for m in page["messages"]] == ["old2", "old pending", "new0", "new1"]
+    res = await async_client.get(f"/messages/{bob_id}", params={"cursor": page["next_cursor"]}, headers=alice)
+    assert [m["message"] for m in res.json()["messages"]] == ["old0", "old1"]
+
+    res = await async_client.get(f"/groups/{group_id}/messages", headers=alice)
+    assert [m["message"] for m in res.json()["messages"]] == ["gold0", "gold1", "gold2", "gnew"]
+
+
+def test_add_months_rolls_over_the_year():
+    month = datetime(2026, 11, 1, tzinfo=timezone.utc)
+    assert archive.add_months(month, 2) == datetime(2027, 1, 1, tzinfo=timezone.utc)
+    assert archive.partition_name("messages", archive.add_months(month, 2)) == "messages_p2027_01"
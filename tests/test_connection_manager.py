@@ -0,0 +1,175 @@
+import asyncio
+from collections import deque
+
+import pytest
+from fastapi import WebSocketDisconnect
+
+from app.routers.ws import Connection, ConnectionManager
+
+
+def test_room_index_tracks_local_members():
+    manager = ConnectionManager()
+    manager.join_rooms(1, [10, 11])
+    manager.join_rooms(2, [10])
+
+    assert manager.room_members(10) == {1, 2}
+    assert manager.room_members(11) == {1}
+
+    manager.leave_rooms(1)
+    assert manager.room_members(10) == {2}
+    assert 11 not in manager.rooms
+
+
+def test_join_room_ignores_users_not_connected_here():
+    manager = ConnectionManager()
+    manager.join_room(10, 3)
+    assert manager.room_members(10) == set()
+
+
+class SlowSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, frame):
+        self.sent.append(frame)
+
+
+def make_connection(policy: str, max_queue: int = 2):
+    manager = ConnectionManager(max_queue=max_queue, policy=policy)
+    conn = Connection(manager, 1, SlowSocket())  # type: ignore
+    manager.active[1] = conn
+    return manager, conn
+
+
+def test_drop_policy_rejects_when_queue_full():
+    manager, conn = make_connection("drop")
+    assert manager.send_json_to(1, {"n": 1})
+    assert manager.send_json_to(1, {"n": 2})
+    assert not manager.send_json_to(1, {"n": 3})
+    assert [frame for _, frame in conn.queue] == ['{"n":1}', '{"n":2}']
+    assert manager.stats()["dropped"] == 1
+
+
+def test_coalesce_policy_replaces_queued_event_with_same_key():
+    manager, conn = make_connection("coalesce")
+    manager.send_json_to(1, {"status": "online"}, key=("presence", 7))
+    manager.send_json_to(1, {"status": "offline"}, key=("presence", 7))
+    manager.send_json_to(1, {"n": 1})
+    manager.send_json_to(1, {"n": 2})
+    assert [frame for _, frame in conn.queue] == ['{"n":1}', '{"n":2}']
+    assert manager.stats()["dropped"] == 1
+
+
+def test_disconnect_policy_marks_connection_closing():
+    manager, conn = make_connection("disconnect", max_queue=1)
+    manager.send_json_to(1, {"n": 1})
+    assert not manager.send_json_to(1, {"n": 2})
+    assert conn.closing
+    assert manager.stats()["slow_disconnects"] == 1
+
+
+@pytest.mark.asyncio
+async def test_writer_drains_queue():
+    manager, conn = make_connection("drop", max_queue=10)
+    conn.start()
+    manager.send_json_to(1, {"n": 1})
+    manager.send_json_to(1, {"n": 2})
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert conn.websocket.sent == ['{"n":1}', '{"n":2}']
+    conn.stop()
+
+
+@pytest.mark.asyncio
+async def test_fan_out_is_held_until_catch_up_is_sent():
+    manager, conn = make_connection("drop", max_queue=10)
+    conn.hold()
+    conn.start()
+    manager.send_json_to(1, {"live": 1})
+    await conn.send_json({"backlog": 1})
+    assert conn.websocket.sent == ['{"backlog":1}']
+
+    conn.release()
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert conn.websocket.sent == ['{"backlog":1}', '{"live":1}']
+    conn.stop()
+
+
+class BrokenSocket:
+    async def send_text(self, frame):
+        raise RuntimeError("socket gone")
+
+
+@pytest.mark.asyncio
+async def test_own_frames_fail_once_the_writer_is_gone():
+    manager = ConnectionManager(max_queue=4, policy="drop")
+    conn = Connection(manager, 1, BrokenSocket())  # type: ignore
+    manager.active[1] = conn
+    conn.start()
+
+    with pytest.raises(WebSocketDisconnect):
+        await conn.send_json({"n": 1})
+    with pytest.raises(WebSocketDisconnect):
+        await conn.send_json({"n": 2})
+    assert 1 not in manager.active
+
+
+def test_presence_reaches_only_watchers_with_one_shared_frame():
+    manager = ConnectionManager(max_queue=4, policy="drop")
+    for uid in (1, 2, 3):
+        manager.active[uid] = Connection(manager, uid, SlowSocket())  # type: ignore
+    manager.watch(2, [1])
+    manager.watch(3, [1])
+    manager.unwatch(3, [1])
+
+    frame = '{"type":"presence","user_id":1}'
+    manager.pending_presence[1] = frame
+    manager._flush_presence(1)
+    assert manager.active[1].queue == deque()
+    assert manager.active[2].queue[0][1] is frame
+    assert manager.active[3].queue == deque()
+
+
+@pytest.mark.asyncio
+async def test_presence_flapping_is_coalesced():
+    manager = ConnectionManager(max_queue=4, policy="drop")
+    manager.active[2] = Connection(manager, 2, SlowSocket())  # type: ignore
+    manager.watch(2, [1])
+    for status in ("online", "offline", "online"):
+        manager.push_presence(1, status)
+    manager.push_presence(5, "unwatched")
+    assert manager.pending_presence == {1: "online"}
+
+    manager._flush_presence(1)
+    assert [frame for _, frame in manager.active[2].queue] == ["online"]
+
+
+class RecordingPubSub:
+    def __init__(self):
+        self.subscribed = set()
+
+    async def subscribe(self, *channels):
+        self.subscribed.update(channels)
+
+    async def unsubscribe(self, *channels):
+        self.subscribed.difference_update(channels)
+
+
+@pytest.mark.asyncio
+async def test_channels_follow_local_users_and_rooms():
+    manager = ConnectionManager()
+    pubsub = RecordingPubSub()
+    manager.pubsub = pubsub  # type: ignore
+    conn = Connection(manager, 1, SlowSocket())  # type: ignore
+    manager.active[1] = conn
+    manager.join_rooms(1, [10])
+    await manager.sync_task  # type: ignore
+
+    assert pubsub.subscribed == {"user:1", "group:10"}
+
+    manager.forget(conn)
+    await manager.sync_task  # type: ignore
+
+    assert pubsub.subscribed == set()
+    assert manager.channels == set()
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, update
+
+from app import conversations
+from app.database import AsyncSessionLocal
+from app.models import Conversation, GroupMember, GroupMessage
+from app.read_receipts import mark_read_up_to
+
+
+@pytest.mark.asyncio
+async def test_conversation_list_tracks_last_message_and_unread(async_client, signup_and_login):
+    alice_id, alice = await signup_and_login("conv_alice")
+    bob_id, bob = await signup_and_login("conv_bob")
+    carol_id, carol = await signup_and_login("conv_carol")
+
+    for text in ("hi bob", "still there?"):
+        await async_client.post("/messages/send", json={"recipient_id": bob_id, "message": text}, headers=alice)
+    res = await async_client.post("/groups/create-group", params={"name": "conv_group"}, headers=bob)
+    group_id = res.json()["group_id"]
+    await async_client.post("/messages/send", json={"recipient_id": bob_id, "message": "x" * 500}, headers=carol)
+
+    res = await async_client.get("/conversations", headers=bob)
+    [group_chat] = [c for c in res.json()["conversations"] if c["kind"] == "group"]
+    assert (group_chat["name"], group_chat["last_message"], group_chat["unread_count"]) == ("conv_group", None, 0)
+
+    async with AsyncSessionLocal() as db:
+        later = datetime.now(timezone.utc) + timedelta(minutes=1)
+        message = GroupMessage(group_id=group_id, author_id=carol_id, message="group news", timestamp=later)
+        db.add(message)
+        await db.flush()
+        await conversations.record_group(
+            db, group_id, {"id": message.id, "author_id": carol_id, "message": "group news", "timestamp": later}
+        )
+        await db.commit()
+
+    res = await async_client.get("/conversations", params={"limit": 2}, headers=bob)
+    page = res.json()
+    assert [(c["kind"], c["name"]) for c in page["conversations"]] == [
+        ("group", "conv_group"),
+        ("direct", "conv_carol"),
+    ]
+    group_chat, carol_chat = page["conversations"]
+    assert (group_chat["last_message"]["preview"], group_chat["unread_count"]) == ("group news", 1)
+    assert carol_chat["unread_count"] == 1
+    assert len(carol_chat["last_message"]["preview"]) == conversations.CONVERSATION_PREVIEW_CHARS
+
+    res = await async_client.get("/conversations", params={"cursor": page["next_cursor"]}, headers=bob)
+    page = res.json()
+    assert [c["peer_id"] for c in page["conversations"]] == [alice_id]
+    assert page["conversations"][0]["last_message"]["preview"] == "still there?"
+    assert page["conversations"][0]["unread_count"] == 2
+    assert page["next_cursor"] is None
+
+    res = await async_client.get("/conversations", headers=alice)
+    [chat] = res.json()["conversations"]
+    assert (chat["peer_id"], chat["name"], chat["unread_count"]) == (bob_id, "conv_bob", 0)
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Conversation.last_message_id).where(Conversation.user_id == bob_id))
+        await mark_read_up_to(db, None, bob_id, alice_id, max(i for i in result.scalars().all() if i))
+        await db.execute(
+            update(GroupMember)
+            .where(GroupMember.group_id == group_id, GroupMember.user_id == bob_id)
+            .values(last_read_message_id=message.id)
+        )
+        await db.commit()
+    res = await async_client.get("/conversations", headers=bob)
+    unread = {(c["kind"], c["peer_id"]): c["unread_count"] for c in res.json()["conversations"]}
+    assert unread == {("group", group_id): 0, ("direct", alice_id): 0, ("direct", carol_id): 1}
+
+
+def test_direct_rows_collapse_a_batch_per_conversation():
+    messages = [
+        {"id": i, "author_id": author, "recipient_id": recipient, "message": f"m{i}", "timestamp": None}
+        for i, (author, recipient) in enumerate([(1, 2), (2, 1), (1, 2), (1, 3)], start=1)
+    ]
+    rows = {(r["user_id"], r["peer_id"]): r for r in conversations.direct_rows(messages)}
+    assert set(rows) == {(1, 2), (2, 1), (1, 3), (3, 1)}
+    assert (rows[(2, 1)]["last_message_id"], rows[(2, 1)]["unread_count"]) == (3, 2)
+    assert (rows[(1, 2)]["last_preview"], rows[(1, 2)]["unread_count"]) == ("m3", 1)
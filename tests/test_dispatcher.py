@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from app.dispatcher import Dispatcher
+
+
+@pytest.mark.asyncio
+async def test_events_for_one_key_stay_in_order_while_keys_run_concurrently():
+    handled = []
+
+    async def handler(key, i):
+        # The slow key must not hold up the other one.
+        await asyncio.sleep(0.02 if key == "group:1" else 0)
+        handled.append((key, i))
+
+    dispatcher = Dispatcher(handler, workers=4)
+    dispatcher.start()
+    for i in range(5):
+        await dispatcher.submit("group:1", "group:1", i)
+        await dispatcher.submit("user:2", "user:2", i)
+    await dispatcher.join()
+    await dispatcher.stop()
+
+    assert [i for key, i in handled if key == "group:1"] == list(range(5))
+    assert [i for key, i in handled if key == "user:2"] == list(range(5))
+    if hash("group:1") % 4 != hash("user:2") % 4:
+        assert handled[:5] == [("user:2", i) for i in range(5)]
+    stats = dispatcher.stats()
+    assert stats["dispatched"] == 10
+    assert stats["queued"] == 0
+
+
+@pytest.mark.asyncio
+async def test_handler_errors_are_counted_and_do_not_stop_the_worker():
+    handled = []
+
+    async def handler(i):
+        if i == 0:
+            raise RuntimeError("boom")
+        handled.append(i)
+
+    dispatcher = Dispatcher(handler, workers=1)
+    dispatcher.start()
+    await dispatcher.submit("k", 0)
+    await dispatcher.submit("k", 1)
+    await dispatcher.join()
+    await dispatcher.stop()
+
+    assert handled == [1]
+    assert dispatcher.stats()["failed"] == 1
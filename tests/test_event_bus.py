@@ -0,0 +1,83 @@
+import pytest
+from redis.exceptions import ResponseError
+
+from app.event_bus import StreamSubscription, stream_key
+
+
+class FakeStreams:
+    def __init__(self):
+        self.groups = set()
+        self.pending = {stream_key("user:1"): [(b"1-0", {b"data": b'{"n": 1}'})]}
+        self.new = {stream_key("user:1"): [(b"2-0", {b"data": b'{"n": 2}'})]}
+        self.acked = []
+        self.expiring = set()
+        self.fail_reads = 0
+
+    async def xgroup_create(self, key, group, id="$", mkstream=False):
+        self.groups.add((key, group, id))
+
+    async def xgroup_destroy(self, key, group):
+        self.groups = {entry for entry in self.groups if entry[:2] != (key, group)}
+
+    async def expire(self, key, ttl):
+        self.expiring.add(key)
+
+    async def xreadgroup(self, group, consumer, streams, count=None, block=None):
+        if self.fail_reads:
+            self.fail_reads -= 1
+            raise ResponseError("NOGROUP No such key or consumer group")
+        response = []
+        for key, cursor in streams.items():
+            source = self.pending if cursor == "0" else self.new
+            response.append([key.encode(), source.pop(key, [])])
+        return response
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def xack(self, key, group, *ids):
+        self.acked.extend(ids)
+
+    async def execute(self):
+        return []
+
+
+@pytest.mark.asyncio
+async def test_stream_subscription_replays_pending_then_reads_new():
+    redis = FakeStreams()
+    sub = StreamSubscription(redis, group="node-a", block_ms=1)
+    await sub.subscribe("user:1")
+
+    received = []
+    async for msg in sub.listen():
+        received.append((msg["channel"], msg["data"]))
+        if len(received) == 2:
+            break
+
+    assert ("user:1", b'{"n": 1}') in received
+    assert received[1] == ("user:1", b'{"n": 2}')
+    assert redis.acked == [b"1-0"]
+    assert sub.streams[stream_key("user:1")] == ">"
+
+
+@pytest.mark.asyncio
+async def test_stream_subscription_recreates_a_group_that_went_away():
+    redis = FakeStreams()
+    sub = StreamSubscription(redis, group="node-a", block_ms=1)
+    await sub.subscribe("user:1", "user:2")
+    # The group is destroyed while a read is blocked on it.
+    await sub.unsubscribe("user:2")
+    redis.fail_reads = 1
+
+    assert await sub.read() == []
+    assert (stream_key("user:1"), "node-a", "0") in redis.groups
+    assert (stream_key("user:2"), "node-a", "0") not in redis.groups
+    assert redis.expiring == {stream_key("user:1"), stream_key("user:2")}
+    batches = await sub.read()
+    assert batches[0][1] == [(b"1-0", {b"data": b'{"n": 1}'})]
+
+
+def test_stream_subscription_requires_a_stable_group(monkeypatch):
+    monkeypatch.setattr("app.event_bus.EVENT_STREAM_GROUP", None)
+    with pytest.raises(ValueError):
+        StreamSubscription(FakeStreams())
@@ -0,0 +1,34 @@
+import pytest
+
+from app.database import AsyncSessionLocal
+from app.models import GroupMessage
+from app.routers.groups import membership_cache
+
+
+@pytest.mark.asyncio
+async def test_group_history_is_paged_and_members_only(async_client, signup_and_login):
+    owner_id, owner = await signup_and_login("history_owner")
+    _, outsider = await signup_and_login("history_outsider")
+    res = await async_client.post("/groups/create-group", params={"name": "history"}, headers=owner)
+    group_id = res.json()["group_id"]
+    async with AsyncSessionLocal() as db:
+        db.add_all(GroupMessage(group_id=group_id, author_id=owner_id, message=f"g{i}") for i in range(5))
+        await db.commit()
+
+    res = await async_client.get(f"/groups/{group_id}/messages", headers=outsider)
+    assert res.status_code == 403
+
+    membership_cache.clear()
+    res = await async_client.get(f"/groups/{group_id}/messages", params={"limit": 3}, headers=owner)
+    page = res.json()
+    assert page["group"] == {"id": group_id, "name": "history"}
+    assert [m["message"] for m in page["messages"]] == ["g2", "g3", "g4"]
+    assert page["messages"][0]["author_name"] == "history_owner"
+    assert membership_cache.get((group_id, owner_id))
+
+    res = await async_client.get(
+        f"/groups/{group_id}/messages", params={"limit": 3, "cursor": page["next_cursor"]}, headers=owner
+    )
+    page = res.json()
+    assert [m["message"] for m in page["messages"]] == ["g0", "g1"]
+    assert page["next_cursor"] is None
@@ -5,3 +5,14 @@ import pytest
 async def test_health(async_client):
     res = await async_client.get("/")
     assert res.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_health_reports_database_pool_and_disabled_redis(async_client):
+    res = await async_client.get("/health")
+    assert res.status_code == 200
+    body = res.json()
+    assert body["redis"] == {"status": "disabled"}
+    assert body["database"]["status"] == "ok"
+    assert body["database"]["pool"]["checked_out"] == 0
+    assert body["database"]["pool"]["acquired"] >= 1
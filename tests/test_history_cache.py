@@ -0,0 +1,61 @@
+import pytest
+
+from app import history_cache
+
+
+class FakeLists:
+    def __init__(self, items, watermarks):
+        self.items = [history_cache.entry(item, history_cache.DIRECT_FIELDS) for item in items]
+        self.watermarks = watermarks
+        self.calls = []
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def lrange(self, key, start, end):
+        self.calls.append(self.items[start:] if self.items else [])
+
+    def llen(self, key):
+        self.calls.append(len(self.items))
+
+    def hgetall(self, key):
+        self.calls.append(self.watermarks)
+
+    async def execute(self):
+        calls, self.calls = self.calls, []
+        return calls
+
+
+def dm(message_id, author_id, recipient_id, status="pending"):
+    return {"message_id": message_id, "author_id": author_id, "recipient_id": recipient_id, "status": status}
+
+
+def test_direct_key_is_shared_by_both_sides():
+    assert history_cache.direct_key(7, 3) == history_cache.direct_key(3, 7) == "history:dm:3:7"
+
+
+def test_only_first_pages_within_the_cache_size_are_cacheable():
+    assert history_cache.cacheable(object(), 20, None, None)
+    assert not history_cache.cacheable(None, 20, None, None)
+    assert not history_cache.cacheable(object(), 20, 100, None)
+    assert not history_cache.cacheable(object(), history_cache.HISTORY_CACHE_SIZE + 1, None, None)
+
+
+@pytest.mark.asyncio
+async def test_first_page_applies_status_watermarks_and_counts_hits():
+    redis = FakeLists(
+        [dm(1, 1, 2), dm(2, 2, 1), dm(3, 1, 2), dm(4, 1, 2)],
+        {b"read:2": b"1", b"delivered:2": b"3"},
+    )
+    hits = history_cache.counters["hits"]
+    page = await history_cache.first_page(redis, "history:dm:1:2", 3)
+
+    assert page is not None
+    entries, has_more = page
+    assert [(m["message_id"], m["status"]) for m in entries] == [(2, "pending"), (3, "delivered"), (4, "pending")]
+    assert has_more
+    assert history_cache.counters["hits"] == hits + 1
+
+    misses = history_cache.counters["misses"]
+    assert await history_cache.first_page(FakeLists([], {}), "history:dm:1:2", 3) is None
+    assert history_cache.counters["misses"] == misses + 1
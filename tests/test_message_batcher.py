@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app.database import AsyncSessionLocal
+from app.message_batcher import MessageBatcher
+from app.models import Messages
+
+
+@pytest.mark.asyncio
+async def test_batcher_returns_ids_in_submit_order():
+    batcher = MessageBatcher(max_batch=10, interval_ms=5, session_factory=AsyncSessionLocal)
+    batcher.start()
+    results = await asyncio.gather(
+        *(batcher.submit(author_id=1, recipient_id=2, message=f"msg {i}", status="pending") for i in range(25))
+    )
+    await batcher.stop()
+
+    ids = [message_id for message_id, _ in results]
+    assert len(set(ids)) == 25
+    assert all(timestamp is not None for _, timestamp in results)
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Messages.id, Messages.message).where(Messages.id.in_(ids)))
+        rows = dict(result.all())
+    assert [rows[message_id] for message_id in ids] == [f"msg {i}" for i in range(25)]
+
+
+@pytest.mark.asyncio
+async def test_stop_flushes_pending_messages():
+    batcher = MessageBatcher(max_batch=10, interval_ms=10_000, session_factory=AsyncSessionLocal)
+    batcher.start()
+    submits = [
+        asyncio.create_task(batcher.submit(author_id=1, recipient_id=2, message=f"late {i}", status="pending"))
+        for i in range(15)
+    ]
+    await asyncio.sleep(0.05)
+    await asyncio.wait_for(batcher.stop(), 5)
+
+    results = await asyncio.wait_for(asyncio.gather(*submits), 5)
+    assert len({message_id for message_id, _ in results}) == 15
+    assert not batcher.running
+
+
+@pytest.mark.asyncio
+async def test_a_bad_row_fails_only_its_own_send():
+    batcher = MessageBatcher(max_batch=3, interval_ms=10_000, session_factory=AsyncSessionLocal)
+    batcher.start()
+    results = await asyncio.gather(
+        batcher.submit(author_id=1, recipient_id=2, message="before", status="pending"),
+        batcher.submit(author_id=None, recipient_id=2, message="bad", status="pending"),
+        batcher.submit(author_id=1, recipient_id=2, message="after", status="pending"),
+        return_exceptions=True,
+    )
+    await batcher.stop()
+
+    assert isinstance(results[1], Exception)
+    ids = [results[0][0], results[2][0]]  # type: ignore
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Messages.message).where(Messages.id.in_(ids)).order_by(Messages.id))
+        assert result.scalars().all() == ["before", "after"]
@@ -0,0 +1,70 @@
+import pytest
+
+from app import database
+
+
+@pytest.mark.asyncio
+async def test_unread_counts_fall_back_to_database(async_client, signup_and_login):
+    alice_id, alice = await signup_and_login("unread_alice")
+    bob_id, bob = await signup_and_login("unread_bob")
+
+    for text in ("hi", "are you there?"):
+        res = await async_client.post("/messages/send", json={"recipient_id": bob_id, "message": text}, headers=alice)
+        assert res.status_code == 200
+
+    res = await async_client.get("/messages/unread", headers=bob)
+    assert res.status_code == 200
+    assert res.json() == {"direct": {str(alice_id): 2}, "groups": {}}
+
+
+@pytest.mark.asyncio
+async def test_writers_read_from_primary_and_others_from_replica(async_client, signup_and_login):
+    alice_id, alice = await signup_and_login("replica_alice")
+    bob_id, bob = await signup_and_login("replica_bob")
+    database.recent_writers.clear()
+
+    res = await async_client.post("/messages/send", json={"recipient_id": bob_id, "message": "hi"}, headers=alice)
+    assert res.status_code == 200
+
+    assert await database.reads_from_primary(None, alice_id)
+    assert not await database.reads_from_primary(None, bob_id)
+    res = await async_client.get(f"/messages/{alice_id}", headers=bob)
+    assert [m["message"] for m in res.json()["messages"]] == ["hi"]
+
+
+@pytest.mark.asyncio
+async def test_direct_history_pages_with_cursors(async_client, signup_and_login):
+    alice_id, alice = await signup_and_login("page_alice")
+    bob_id, bob = await signup_and_login("page_bob")
+    for i in range(5):
+        sender, recipient_id = (alice, bob_id) if i % 2 == 0 else (bob, alice_id)
+        await async_client.post(
+            "/messages/send", json={"recipient_id": recipient_id, "message": f"m{i}"}, headers=sender
+        )
+
+    res = await async_client.get(f"/messages/{bob_id}", params={"limit": 2}, headers=alice)
+    page = res.json()
+    assert [m["message"] for m in page["messages"]] == ["m3", "m4"]
+    assert page["messages"][0]["author_name"] == "page_bob"
+
+    res = await async_client.get(
+        f"/messages/{bob_id}", params={"limit": 2, "cursor": page["next_cursor"]}, headers=alice
+    )
+    page = res.json()
+    assert [m["message"] for m in page["messages"]] == ["m1", "m2"]
+
+    res = await async_client.get(
+        f"/messages/{bob_id}", params={"limit": 2, "cursor": page["next_cursor"]}, headers=alice
+    )
+    page = res.json()
+    assert [m["message"] for m in page["messages"]] == ["m0"]
+    assert page["next_cursor"] is None
+
+    first_id = page["messages"][0]["message_id"]
+    res = await async_client.get(f"/messages/{alice_id}", params={"after_id": first_id, "limit": 3}, headers=bob)
+    page = res.json()
+    assert [m["message"] for m in page["messages"]] == ["m1", "m2", "m3"]
+    assert page["next_cursor"] is not None
+
+    res = await async_client.get(f"/messages/{alice_id}", params={"cursor": "not-a-cursor"}, headers=bob)
+    assert res.status_code == 400
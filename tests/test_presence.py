@@ -0,0 +1,48 @@
+import pytest
+
+from app import presence
+
+
+class FakePresence:
+    def __init__(self, last_seen):
+        self.dirty = {str(user_id).encode() for user_id in last_seen}
+        self.last_seen = {str(user_id).encode(): seen.encode() for user_id, seen in last_seen.items()}
+        self.cleared = []
+
+    async def srandmember(self, key, count):
+        return sorted(self.dirty)[:count]
+
+    async def hmget(self, key, fields):
+        return [self.last_seen.get(field) for field in fields]
+
+    async def eval(self, script, numkeys, *args):
+        pairs = args[numkeys:]
+        self.cleared.extend(pairs[::2])
+        self.dirty -= {user_id.encode() for user_id in pairs[::2]}
+
+
+@pytest.mark.asyncio
+async def test_flush_last_seen_keeps_ids_dirty_when_the_update_fails(monkeypatch):
+    redis = FakePresence({1: "2026-01-01T00:00:00+00:00"})
+
+    def broken_session():
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(presence, "AsyncSessionLocal", broken_session)
+    with pytest.raises(RuntimeError):
+        await presence.flush_last_seen(redis)
+    assert redis.dirty == {b"1"}
+    assert redis.cleared == []
+
+
+@pytest.mark.asyncio
+async def test_flush_last_seen_clears_ids_after_commit(async_client, signup_and_login):
+    user_id, headers = await signup_and_login("seen_alice")
+    redis = FakePresence({user_id: "2026-01-01T00:00:00+00:00"})
+
+    assert await presence.flush_last_seen(redis) == 1
+    assert redis.cleared == [str(user_id)]
+    assert redis.dirty == set()
+
+    res = await async_client.get(f"/users/presence/{user_id}")
+    assert res.json()["last_seen"].startswith("2026-01-01T00:00:00")
@@ -0,0 +1,28 @@
+import time
+
+import pytest
+
+from app.utils import rate_limit
+
+
+@pytest.mark.asyncio
+async def test_locally_blocked_sender_skips_redis():
+    rate_limit._blocked_until.clear()
+    rate_limit._block_locally("rl:1:send_message", 60_000)
+
+    assert await rate_limit.check_rate_limit(None, "rl:1:send_message", limit=20, window_seconds=60) is False
+
+
+def test_local_block_expires():
+    rate_limit._blocked_until.clear()
+    rate_limit._blocked_until["rl:2:send_message"] = time.monotonic() - 1
+
+    assert rate_limit._locally_blocked("rl:2:send_message") is False
+    assert "rl:2:send_message" not in rate_limit._blocked_until
+
+
+@pytest.mark.asyncio
+async def test_unknown_algorithm_rejected():
+    rate_limit._blocked_until.clear()
+    with pytest.raises(ValueError):
+        await rate_limit.check_rate_limit(None, "rl:3:send_message", 20, 60, algorithm="leaky")
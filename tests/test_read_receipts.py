@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app.database import AsyncSessionLocal
+from app.models import Messages, User
+from app.read_receipts import ReadCursorCoalescer
+
+
+@pytest.mark.asyncio
+async def test_read_cursor_marks_everything_up_to_the_highest_cursor():
+    async with AsyncSessionLocal() as db:
+        author, reader = User(username="cursor_author", password="x"), User(username="cursor_reader", password="x")
+        db.add_all([author, reader])
+        await db.flush()
+        msgs = [Messages(author_id=author.id, recipient_id=reader.id, message=f"m{i}") for i in range(4)]
+        db.add_all(msgs)
+        await db.commit()
+        ids = [m.id for m in msgs]
+
+    reads = ReadCursorCoalescer(reader.id, redis=None, delay_ms=10_000)  # type: ignore
+    reads.add(author.id, ids[0])
+    reads.add(author.id, ids[2])
+    reads.add(author.id, ids[1])
+    assert reads.cursors == {author.id: ids[2]}
+    await reads.close()
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Messages.id, Messages.status).where(Messages.id.in_(ids)))
+        statuses = dict(result.all())
+    assert [statuses[i] for i in ids] == ["read", "read", "read", "pending"]
+
+
+@pytest.mark.asyncio
+async def test_close_waits_for_a_flush_in_progress(monkeypatch):
+    started, release, stored = asyncio.Event(), asyncio.Event(), []
+
+    async def slow_mark(db, redis, reader_id, peer_id, up_to):
+        started.set()
+        await release.wait()
+        stored.append((peer_id, up_to))
+
+    monkeypatch.setattr("app.read_receipts.mark_read_up_to", slow_mark)
+    reads = ReadCursorCoalescer(1, redis=None, delay_ms=0)  # type: ignore
+    reads.add(2, 10)
+    await started.wait()
+    reads.add(3, 20)
+    closing = asyncio.create_task(reads.close())
+    await asyncio.sleep(0)
+    release.set()
+    await closing
+
+    assert stored == [(2, 10), (3, 20)]
+
+
+@pytest.mark.asyncio
+async def test_cursor_added_during_a_flush_is_flushed_next(monkeypatch):
+    started, release, stored = asyncio.Event(), asyncio.Event(), []
+
+    async def slow_mark(db, redis, reader_id, peer_id, up_to):
+        stored.append((peer_id, up_to))
+        started.set()
+        await release.wait()
+
+    monkeypatch.setattr("app.read_receipts.mark_read_up_to", slow_mark)
+    reads = ReadCursorCoalescer(1, redis=None, delay_ms=0)  # type: ignore
+    reads.add(2, 10)
+    await started.wait()
+    reads.add(2, 20)
+    release.set()
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+    assert stored == [(2, 10), (2, 20)]
+    assert reads.cursors == {}
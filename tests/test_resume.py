@@ -0,0 +1,40 @@
+import json
+
+import pytest
+from sqlalchemy import select
+
+from app.database import AsyncSessionLocal
+from app.models import Messages, User
+from app.resume import gap
+from app.routers import ws
+
+
+def test_gap_returns_only_missed_frames():
+    frames = ['{"seq":4}', '{"seq":5}', '{"seq":6}']
+
+    assert gap(6, frames, 4) == ['{"seq":5}', '{"seq":6}']
+    assert gap(6, frames, 3) == frames
+    assert gap(6, frames, 6) == []
+    assert gap(6, frames, 2) is None
+    assert gap(6, frames, 9) is None
+
+
+@pytest.mark.asyncio
+async def test_replayed_direct_messages_are_marked_delivered(recording_socket):
+    async with AsyncSessionLocal() as db:
+        users = [User(username=name, email=f"{name}@example.com", password="x") for name in ("rs_a", "rs_b")]
+        db.add_all(users)
+        await db.commit()
+        msg = Messages(author_id=users[0].id, recipient_id=users[1].id, message="hi", status="pending")
+        db.add(msg)
+        await db.commit()
+        author_id, recipient_id, message_id = users[0].id, users[1].id, msg.id
+
+    event = {"type": "message", "message_id": message_id, "author_id": author_id, "recipient_id": recipient_id}
+    socket = recording_socket()
+    await ws.replay_events(recipient_id, socket, ['{"seq":3,' + json.dumps(event)[1:]])  # type: ignore
+
+    assert socket.frames == [{"type": "resume_batch", "events": [{"seq": 3, **event}]}]
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Messages.status).where(Messages.id == message_id))
+        assert result.scalar_one() == "delivered"
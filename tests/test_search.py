@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import archive
+from app.database import AsyncSessionLocal
+from app.models import GroupMessage, Messages
+from app.search import fts_query
+
+
+@pytest.mark.asyncio
+async def test_search_is_ranked_paged_and_scoped_to_the_caller(async_client, signup_and_login):
+    alice_id, alice = await signup_and_login("search_alice")
+    bob_id, bob = await signup_and_login("search_bob")
+    carol_id, _ = await signup_and_login("search_carol")
+    res = await async_client.post("/groups/create-group", params={"name": "search_group"}, headers=alice)
+    group_id = res.json()["group_id"]
+
+    async with AsyncSessionLocal() as db:
+        db.add(Messages(author_id=alice_id, recipient_id=bob_id, message="the zebra crossing is closed"))
+        db.add(Messages(author_id=bob_id, recipient_id=alice_id, message="zebras zebras everywhere"))
+        db.add(Messages(author_id=bob_id, recipient_id=carol_id, message="a secret zebra for carol"))
+        old = datetime.now(timezone.utc) - timedelta(days=archive.ARCHIVE_AFTER_DAYS + 1)
+        db.add(GroupMessage(group_id=group_id, author_id=alice_id, message="group zebra meetup", timestamp=old))
+        edited = Messages(author_id=alice_id, recipient_id=bob_id, message="nothing to see")
+        db.add(edited)
+        await db.commit()
+        edited.message = "an edited zebra"
+        await db.commit()
+        assert (await archive.archive_all(db))["group_messages"] == 1
+
+    res = await async_client.get("/search", params={"q": "zebra", "limit": 3}, headers=alice)
+    page = res.json()
+    assert res.status_code == 200
+    assert page["results"][0]["snippet"] == "<mark>zebras</mark> <mark>zebras</mark> everywhere"
+    assert page["results"][0]["peer_id"] == bob_id
+    assert page["results"][0]["author_name"] == "search_bob"
+    res = await async_client.get("/search", params={"q": "zebra", "cursor": page["next_cursor"]}, headers=alice)
+    rest = res.json()
+    assert rest["next_cursor"] is None
+    found = {(r["kind"], r["message_id"]) for r in page["results"] + rest["results"]}
+    assert len(found) == 4
+    assert {kind for kind, _ in found} == {"direct", "group"}
+
+    res = await async_client.get("/search", params={"q": "zebra"}, headers=bob)
+    assert {r["peer_id"] for r in res.json()["results"]} == {alice_id, carol_id}
+
+    res = await async_client.get("/search", params={"q": 'zebra" OR NOT'}, headers=alice)
+    assert res.status_code == 200
+
+
+def test_fts_query_quotes_every_term():
+    assert fts_query('zebra" OR NOT (x') == '"zebra" "OR" "NOT" "x"'
@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy import select
+
+from app.database import AsyncSessionLocal
+from app.models import User
+from app.utils.cache import TTLCache
+from app.utils.user import get_username, get_usernames, invalidate_user, user_cache
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache: TTLCache[int, str] = TTLCache(maxsize=2, ttl=60)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    cache.get(1)
+    cache.set(3, "c")
+    assert cache.get(1) == "a"
+    assert cache.get(2) is None
+    assert cache.get(3) == "c"
+
+
+def test_ttl_cache_expires_entries():
+    cache: TTLCache[int, str] = TTLCache(maxsize=2, ttl=-1)
+    cache.set(1, "a")
+    assert cache.get(1) is None
+
+
+@pytest.mark.asyncio
+async def test_get_usernames_uses_cache(async_client):
+    await async_client.post(
+        "/auth/signup", json={"username": "cached", "email": "cached@example.com", "password": "pw"}
+    )
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(User.id).where(User.username == "cached"))
+        user_id = result.scalar_one()
+        invalidate_user(user_id)
+
+        assert await get_usernames([user_id, -1], db) == {user_id: "cached", -1: None}
+        hits = user_cache.hits
+        assert await get_username(user_id, db) == "cached"
+        assert user_cache.hits == hits + 1
@@ -0,0 +1,24 @@
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_presence_falls_back_to_database_without_redis(async_client):
+    await async_client.post(
+        "/auth/signup", json={"username": "present", "email": "present@example.com", "password": "pw"}
+    )
+    users = (await async_client.get("/users/all")).json()
+    user_id = next(u["id"] for u in users if u["username"] == "present")
+
+    res = await async_client.get(f"/users/presence/{user_id}")
+    assert res.status_code == 200
+    assert res.json() == {"user_id": user_id, "presence_status": "offline", "last_seen": None}
+
+    res = await async_client.get("/users/presence/999999")
+    assert res.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_online_lists_local_connections_without_redis(async_client):
+    res = await async_client.get("/users/online")
+    assert res.status_code == 200
+    assert res.json() == {"online": []}
@@ -0,0 +1,100 @@
+import pytest
+from sqlalchemy import select
+
+from app.database import AsyncSessionLocal
+from app.models import Group, GroupMember, GroupMessage, Messages, User
+from app.routers import ws
+
+
+async def create_users(*names):
+    async with AsyncSessionLocal() as db:
+        users = [User(username=name, email=f"{name}@example.com", password="x") for name in names]
+        db.add_all(users)
+        await db.commit()
+        return [user.id for user in users]
+
+
+@pytest.mark.asyncio
+async def test_pending_messages_are_drained_in_pages(monkeypatch, recording_socket):
+    author_id, recipient_id = await create_users("drain_author", "drain_recipient")
+    async with AsyncSessionLocal() as db:
+        db.add_all(
+            Messages(author_id=author_id, recipient_id=recipient_id, message=f"m{i}", status="pending")
+            for i in range(5)
+        )
+        await db.commit()
+
+    monkeypatch.setattr(ws, "PENDING_PAGE_SIZE", 2)
+    socket = recording_socket()
+    await ws.send_pending_messages(recipient_id, socket)  # type: ignore
+
+    assert [frame["type"] for frame in socket.frames] == ["message_batch"] * 3
+    messages = [m for frame in socket.frames for m in frame["messages"]]
+    assert [m["message"] for m in messages] == [f"m{i}" for i in range(5)]
+    assert {m["author_name"] for m in messages} == {"drain_author"}
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Messages.status).where(Messages.recipient_id == recipient_id))
+        assert set(result.scalars().all()) == {"delivered"}
+
+    socket = recording_socket()
+    await ws.send_pending_messages(recipient_id, socket)  # type: ignore
+    assert socket.frames == []
+
+
+@pytest.mark.asyncio
+async def test_group_catchup_caps_each_group_and_advances_read_markers(monkeypatch, recording_socket):
+    author_id, reader_id = await create_users("group_author", "group_reader")
+    async with AsyncSessionLocal() as db:
+        groups = [Group(name="big", created_by=author_id), Group(name="small", created_by=author_id)]
+        db.add_all(groups)
+        await db.flush()
+        big, small = groups[0].id, groups[1].id
+        db.add_all(GroupMember(group_id=gid, user_id=reader_id, last_read_message_id=0) for gid in (big, small))
+        db.add_all(GroupMessage(group_id=big, author_id=author_id, message=f"b{i}") for i in range(3))
+        db.add(GroupMessage(group_id=small, author_id=author_id, message="s0"))
+        await db.commit()
+
+    monkeypatch.setattr(ws, "GROUP_CATCHUP_LIMIT", 2)
+    socket = recording_socket()
+    await ws.send_unread_group_messages(reader_id, socket)  # type: ignore
+
+    [frame] = socket.frames
+    groups_by_id = {g["group_id"]: g for g in frame["groups"]}
+    assert [m["message"] for m in groups_by_id[big]["messages"]] == ["b0", "b1"]
+    assert groups_by_id[big]["has_more"] is True
+    assert [m["message"] for m in groups_by_id[small]["messages"]] == ["s0"]
+    assert groups_by_id[small]["has_more"] is False
+    assert groups_by_id[small]["messages"][0]["author_name"] == "group_author"
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(GroupMember.group_id, GroupMember.last_read_message_id).where(GroupMember.user_id == reader_id)
+        )
+        markers = dict(result.all())
+    assert markers[big] == groups_by_id[big]["cursor"]
+    assert markers[small] == groups_by_id[small]["cursor"]
+
+    socket = recording_socket()
+    await ws.send_unread_group_messages(reader_id, socket, group_id=big)  # type: ignore
+    [frame] = socket.frames
+    assert [m["message"] for m in frame["groups"][0]["messages"]] == ["b2"]
+
+    advanced = []
+
+    async def record_advance(redis, user_id, read_counts):
+        advanced.append(read_counts)
+
+    monkeypatch.setattr(ws.unread, "advance_group_reads", record_advance)
+    socket = recording_socket()
+    await ws.send_unread_group_messages(reader_id, socket, group_id=big, after_id=0, redis=True)  # type: ignore
+    [frame] = socket.frames
+    assert [m["message"] for m in frame["groups"][0]["messages"]] == ["b0", "b1"]
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(GroupMember.last_read_message_id).where(
+                GroupMember.user_id == reader_id, GroupMember.group_id == big
+            )
+        )
+        assert result.scalar_one() > groups_by_id[big]["cursor"]
+    assert advanced == []